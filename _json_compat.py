@@ -0,0 +1,59 @@
+"""
+JSON序列化工具 - 优先使用orjson，未安装时回退到标准库json
+
+各示例脚本共享同一组序列化函数，两种实现的输出格式保持一致：
+非ASCII字符原样输出，紧凑格式不含空格，缩进格式为2格，允许非字符串的字典键。
+"""
+
+import json
+import sys
+from typing import Any
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        """序列化为紧凑JSON字符串"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """序列化为UTF-8编码的紧凑JSON字节串"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps_pretty(obj: Any) -> str:
+        """序列化为缩进2格的JSON字符串"""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+    def print_pretty(obj: Any) -> None:
+        """以缩进2格的JSON输出到标准输出 - UTF-8输出时直接写入字节，不再解码为完整的str"""
+        buffer = getattr(sys.stdout, "buffer", None)
+        if buffer is None or (getattr(sys.stdout, "encoding", None) or "").lower() not in ("utf-8", "utf8"):
+            print(dumps_pretty(obj))
+            return
+        # 先刷新文本层中已缓冲的内容，保证输出顺序
+        sys.stdout.flush()
+        buffer.write(orjson.dumps(
+            obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        ))
+        buffer.flush()
+
+    loads = orjson.loads
+except ImportError:
+    def dumps(obj: Any) -> str:
+        """序列化为紧凑JSON字符串"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """序列化为UTF-8编码的紧凑JSON字节串"""
+        return dumps(obj).encode()
+
+    def dumps_pretty(obj: Any) -> str:
+        """序列化为缩进2格的JSON字符串"""
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
+    def print_pretty(obj: Any) -> None:
+        """以缩进2格的JSON输出到标准输出 - 边编码边写入，不构建完整的字符串"""
+        json.dump(obj, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+
+    loads = json.loads
@@ -0,0 +1,44 @@
+"""
+关键词匹配工具 - 将关键词集合预编译为正则，供各示例脚本共享
+
+1. compile_any_keyword: 判断文本中是否出现任意一个关键词
+2. compile_keyword_scanner: 单次扫描找出文本中出现的所有关键词
+"""
+
+import re
+from typing import Iterable
+
+
+def compile_any_keyword(keywords: Iterable[str]) -> re.Pattern:
+    """将关键词编译为普通的多选正则，用于判断是否出现任意一个关键词"""
+    return re.compile("|".join(re.escape(kw) for kw in keywords))
+
+
+def compile_keyword_scanner(keywords: Iterable[str]) -> re.Pattern:
+    """
+    将关键词编译为单次扫描的多模式匹配器，findall返回文本中出现的关键词
+
+    使用零宽前瞻，使得相互重叠的关键词（如"不满"与"非常不满"）都能被命中，
+    与逐个 `keyword in text` 的判断结果一致。同一位置只会命中最长的关键词，
+    因此关键词之间不能存在前缀关系（如"查询"与"查询订单"），构建时直接报错。
+
+    Args:
+        keywords: 关键词集合
+
+    Returns:
+        编译后的正则
+
+    Raises:
+        ValueError: 关键词为空，或存在互为前缀的关键词时
+    """
+    unique = sorted(set(keywords))
+    if not unique or not unique[0]:
+        raise ValueError("关键词集合不能为空，也不能包含空字符串")
+
+    # 排序后，若某个关键词是其他关键词的前缀，则它一定是紧随其后的关键词的前缀
+    for shorter, longer in zip(unique, unique[1:]):
+        if longer.startswith(shorter):
+            raise ValueError(f"关键词之间不能存在前缀关系: {shorter!r} 是 {longer!r} 的前缀")
+
+    alternation = "|".join(re.escape(kw) for kw in sorted(unique, key=len, reverse=True))
+    return re.compile(f"(?=({alternation}))")
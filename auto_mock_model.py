@@ -8,12 +8,76 @@ AutoMockToolCallingModel - 自动选择Agent中第一个工具的Mock模型
 from typing import Iterator, Dict, Any, List, Optional, Callable
 import uuid
 import re
-import json
+from functools import lru_cache
 from strands.models.model import Model
 from strands.types.streaming import StreamEvent
 from strands.types.tools import ToolConfig, ToolSpec
 from strands.types.content import Messages
 
+from _json_compat import dumps as _dumps, dumps_bytes as _dumps_bytes
+
+
+# 预编译的正则表达式，避免每次生成工具输入时重复解析
+_MATH_RE = re.compile(r'[\d+\-*/\(\)\s]+')
+_NUM_RE = re.compile(r'\d+')
+
+
+# ==================== 字段值生成函数 ====================
+# 每个函数接收(字段名, 最后一条用户消息)，返回该字段的自动生成值
+
+# 字符串字段按字段名分类
+_TEXT_FIELDS = frozenset({"message", "text", "content", "query"})
+_MATH_FIELDS = frozenset({"expression", "formula"})
+_LOCATION_FIELDS = frozenset({"city", "location"})
+
+# 可识别的城市，按优先级排列
+_CITIES = ("北京", "上海", "广州", "深圳", "杭州", "南京", "武汉", "成都")
+
+
+def _string_value(field_name: str, message: str) -> str:
+    """生成字符串字段的值"""
+    if field_name in _TEXT_FIELDS:
+        return message
+    if field_name in _MATH_FIELDS:
+        # 尝试提取数学表达式
+        match = _MATH_RE.search(message)
+        return match.group().strip() if match else "1+1"
+    if field_name in _LOCATION_FIELDS:
+        # 尝试提取城市名 - 多个城市同时出现时按_CITIES的优先级选择
+        return next((city for city in _CITIES if city in message), "北京")
+    return f"auto_{field_name}"
+
+
+def _number_value(field_name: str, message: str) -> int:
+    """生成数字字段的值 - 尝试从消息中提取数字"""
+    match = _NUM_RE.search(message)
+    return int(match.group()) if match else 42
+
+
+def _boolean_value(field_name: str, message: str) -> bool:
+    """生成布尔字段的值"""
+    return True
+
+
+def _array_value(field_name: str, message: str) -> List[str]:
+    """生成数组字段的值"""
+    return ["auto_item"]
+
+
+def _object_value(field_name: str, message: str) -> Dict[str, str]:
+    """生成对象字段的值"""
+    return {"auto_key": "auto_value"}
+
+
+# JSON Schema类型 -> 字段值生成函数
+_FIELD_HANDLERS: Dict[str, Callable[[str, str], Any]] = {
+    "string": _string_value,
+    "number": _number_value,
+    "boolean": _boolean_value,
+    "array": _array_value,
+    "object": _object_value,
+}
+
 
 class AutoMockToolCallingModel(Model):
     """
@@ -25,6 +89,20 @@ class AutoMockToolCallingModel(Model):
     3. 智能生成工具输入参数
     4. 没有工具时提供清晰的错误信息
     """
+
+    # 固定不变的流式事件 - 在类级别构建一次，stream()直接yield共享实例
+    # 注意：下游消费者只读取事件内容，不得修改这些字典
+    _MESSAGE_START_EVENT = {"messageStart": {"role": "assistant"}}
+    _TEXT_BLOCK_START_EVENT = {"contentBlockStart": {"start": {"type": "text"}}}
+    _CONTENT_BLOCK_STOP_EVENT = {"contentBlockStop": {}}
+    _END_TURN_STOP_EVENT = {"messageStop": {"stopReason": "end_turn"}}
+    _TOOL_USE_STOP_EVENT = {"messageStop": {"stopReason": "tool_use"}}
+    _USAGE = {"inputTokens": 10, "outputTokens": 15, "totalTokens": 25}
+    _METRICS = {"latencyMs": 100}
+    _METADATA_EVENT = {"metadata": {"usage": _USAGE, "metrics": _METRICS}}
+
+    # 工具输入每个contentBlockDelta携带的最大字符数
+    _TOOL_INPUT_CHUNK_SIZE = 512
     
     def __init__(
         self,
@@ -46,15 +124,31 @@ class AutoMockToolCallingModel(Model):
         """
         self.model_id = model_id
         self.response_text = response_text
+        self._emit_text = bool(response_text)  # 是否输出响应文本，配置固定后无需每次判断
         self.auto_input_generator = auto_input_generator
         self.max_tool_calls = max_tool_calls
         self.call_count = 0  # 工具调用计数器
-        self.config = {
-            "model_id": model_id,
-            "streaming": True,
-            **kwargs
-        }
+        self._tool_info_cache: Dict[tuple, Dict[str, Any]] = {}  # 工具名称序列 -> 工具信息
+        self.config = {"model_id": model_id, "streaming": True}
+        self.config.update(kwargs)
     
+    def _build_tool_config(self, tool_specs: Optional[List[ToolSpec]]) -> Optional[ToolConfig]:
+        """
+        将工具规范列表转换为tool_config
+
+        Args:
+            tool_specs: 工具规范列表
+
+        Returns:
+            工具配置对象，没有工具时返回None
+        """
+        if not tool_specs:
+            return None
+
+        # ToolSpec本身就包含name/description/inputSchema字段，直接包装列表即可，
+        # 无需逐个复制工具规范（_get_first_tool_info通常只读取第一个工具）
+        return {"tools": tool_specs}
+
     def _get_first_tool_info(self, tool_config: Optional[ToolConfig]) -> Dict[str, Any]:
         """
         从tool_config中获取第一个工具的信息
@@ -106,42 +200,11 @@ class AutoMockToolCallingModel(Model):
         last_user_message = self._extract_last_user_message(messages)
         
         for field_name, field_info in properties.items():
-            field_type = field_info.get("type", "string")
-            
-            if field_type == "string":
-                if field_name in ["message", "text", "content", "query"]:
-                    auto_input[field_name] = last_user_message
-                elif field_name in ["expression", "formula"]:
-                    # 尝试提取数学表达式
-                    math_pattern = r'[\d+\-*/\(\)\s]+'
-                    matches = re.findall(math_pattern, last_user_message)
-                    auto_input[field_name] = matches[0].strip() if matches else "1+1"
-                elif field_name in ["city", "location"]:
-                    # 尝试提取城市名
-                    cities = ["北京", "上海", "广州", "深圳", "杭州", "南京", "武汉", "成都"]
-                    for city in cities:
-                        if city in last_user_message:
-                            auto_input[field_name] = city
-                            break
-                    else:
-                        auto_input[field_name] = "北京"
-                else:
-                    auto_input[field_name] = f"auto_{field_name}"
-            
-            elif field_type == "number":
-                # 尝试从消息中提取数字
-                numbers = re.findall(r'\d+', last_user_message)
-                auto_input[field_name] = int(numbers[0]) if numbers else 42
-            
-            elif field_type == "boolean":
-                auto_input[field_name] = True
-            
-            elif field_type == "array":
-                auto_input[field_name] = ["auto_item"]
-            
-            elif field_type == "object":
-                auto_input[field_name] = {"auto_key": "auto_value"}
-        
+            # 按字段类型分派到对应的生成函数，未知类型不生成值
+            handler = _FIELD_HANDLERS.get(field_info.get("type", "string"))
+            if handler is not None:
+                auto_input[field_name] = handler(field_name, last_user_message)
+
         # 确保必需字段都有值
         for required_field in required_fields:
             if required_field not in auto_input:
@@ -160,11 +223,16 @@ class AutoMockToolCallingModel(Model):
             最后一条用户消息的文本内容
         """
         for msg in reversed(messages):
-            if msg.get("role") == "user":
-                content = msg.get("content", [])
-                for block in content:
-                    if block.get("text"):
-                        return block["text"]
+            # 格式正确的消息直接按键访问，缺少字段时跳过该消息
+            try:
+                if msg["role"] != "user":
+                    continue
+                for block in msg["content"]:
+                    text = block.get("text")
+                    if text:
+                        return text
+            except (KeyError, TypeError):
+                continue
         return "默认用户输入"
     
     def format_request(
@@ -205,105 +273,46 @@ class AutoMockToolCallingModel(Model):
         
         # 检查是否超过最大调用次数
         if self.call_count > self.max_tool_calls:
-            yield {
-                "messageStart": {"role": "assistant"}
-            }
-            
-            yield {
-                "contentBlockStart": {
-                    "start": {"type": "text"}
-                }
-            }
-            
-            response_text = "根据工具执行结果，我已经为您完成了请求的操作。"
-            if self.response_text:
-                response_text = self.response_text
-            
-            yield {
-                "contentBlockDelta": {
-                    "delta": {"text": response_text}
-                }
-            }
-            
-            yield {
-                "contentBlockStop": {}
-            }
-            
-            yield {
-                "messageStop": {
-                    "stopReason": "end_turn"
-                }
-            }
-            
-            yield {
-                "metadata": {
-                    "usage": {
-                        "inputTokens": 10,
-                        "outputTokens": 15,
-                        "totalTokens": 25
-                    },
-                    "metrics": {
-                        "latencyMs": 100
-                    }
-                }
-            }
+            response_text = self.response_text if self._emit_text else "根据工具执行结果，我已经为您完成了请求的操作。"
+
+            yield self._MESSAGE_START_EVENT
+            yield self._TEXT_BLOCK_START_EVENT
+            yield {"contentBlockDelta": {"delta": {"text": response_text}}}
+            yield self._CONTENT_BLOCK_STOP_EVENT
+            yield self._END_TURN_STOP_EVENT
+            yield self._METADATA_EVENT
             return
         
         # 从请求中提取数据
         messages = request.get("messages", [])
         tool_specs = request.get("tool_specs", [])
         system_prompt = request.get("system_prompt")
-        
-        # 构建tool_config
-        tool_config = None
-        if tool_specs:
-            tool_config = {
-                "tools": [
-                    {
-                        "name": spec["name"],
-                        "description": spec.get("description", ""),
-                        "inputSchema": spec.get("inputSchema", {})
-                    }
-                    for spec in tool_specs
-                ]
-            }
-        
+
         # 调用原来的stream方法逻辑
         try:
-            # 获取第一个工具信息
-            tool_info = self._get_first_tool_info(tool_config)
+            # 获取第一个工具信息 - 按工具名称序列缓存，工具集合未变化时跳过tool_config的重建和解析
+            cache_key = tuple(spec["name"] for spec in tool_specs) if tool_specs else ()
+            tool_info = self._tool_info_cache.get(cache_key)
+            if tool_info is None:
+                tool_info = self._get_first_tool_info(self._build_tool_config(tool_specs))
+                self._tool_info_cache[cache_key] = tool_info
             tool_name = tool_info["name"]
             
             # 生成工具输入
             tool_input = self._generate_tool_input(tool_info, messages)
-            tool_use_id = f"auto_{tool_name}_{hash(str(tool_input)) % 10000}"
+            # toolUseId只需唯一，直接使用随机UUID，避免对输入字典做str()和哈希
+            tool_use_id = f"auto_{tool_name}_{uuid.uuid4().hex[:8]}"
             
             # 开始消息事件
-            yield {
-                "messageStart": {
-                    "role": "assistant"
-                }
-            }
+            yield self._MESSAGE_START_EVENT
             
             # 响应文本（可选）
-            if self.response_text:
-                yield {
-                    "contentBlockStart": {
-                        "start": {"type": "text"}
-                    }
-                }
-                
-                yield {
-                    "contentBlockDelta": {
-                        "delta": {"text": self.response_text}
-                    }
-                }
-                
-                yield {
-                    "contentBlockStop": {}
-                }
+            if self._emit_text:
+                yield self._TEXT_BLOCK_START_EVENT
+                yield {"contentBlockDelta": {"delta": {"text": self.response_text}}}
+                yield self._CONTENT_BLOCK_STOP_EVENT
             
-            # 工具调用事件
+            # 工具调用事件 - 只有携带工具名称和输入的事件需要每次构建
             yield {
                 "contentBlockStart": {
                     "start": {
@@ -316,38 +325,22 @@ class AutoMockToolCallingModel(Model):
                 }
             }
             
-            yield {
-                "contentBlockDelta": {
-                    "delta": {
-                        "toolUse": {
-                            "input": json.dumps(tool_input) if isinstance(tool_input, dict) else str(tool_input)
-                        }
-                    }
-                }
-            }
+            # 工具输入按固定大小分块输出，下游拼接所有delta后得到完整JSON
+            payload = _dumps(tool_input) if isinstance(tool_input, dict) else str(tool_input)
+            chunk_size = self._TOOL_INPUT_CHUNK_SIZE
+            for offset in range(0, max(len(payload), 1), chunk_size):
+                yield {"contentBlockDelta": {"delta": {"toolUse": {"input": payload[offset:offset + chunk_size]}}}}
             
-            yield {
-                "contentBlockStop": {}
-            }
+            yield self._CONTENT_BLOCK_STOP_EVENT
             
             # 消息结束
-            yield {
-                "messageStop": {
-                    "stopReason": "tool_use"
-                }
-            }
+            yield self._TOOL_USE_STOP_EVENT
             
             # 元数据
             yield {
                 "metadata": {
-                    "usage": {
-                        "inputTokens": 10,
-                        "outputTokens": 15,
-                        "totalTokens": 25
-                    },
-                    "metrics": {
-                        "latencyMs": 100
-                    },
+                    "usage": self._USAGE,
+                    "metrics": self._METRICS,
                     "auto_selected_tool": tool_name,
                     "tool_input": tool_input
                 }
@@ -355,31 +348,27 @@ class AutoMockToolCallingModel(Model):
             
         except ValueError as e:
             # 没有工具时的错误处理
-            yield {
-                "messageStart": {"role": "assistant"}
-            }
-            
-            yield {
-                "contentBlockStart": {
-                    "start": {"type": "text"}
-                }
-            }
-            
-            yield {
-                "contentBlockDelta": {
-                    "delta": {"text": f"错误：{str(e)}"}
-                }
-            }
-            
-            yield {
-                "contentBlockStop": {}
-            }
+            yield self._MESSAGE_START_EVENT
+            yield self._TEXT_BLOCK_START_EVENT
+            yield {"contentBlockDelta": {"delta": {"text": f"错误：{str(e)}"}}}
+            yield self._CONTENT_BLOCK_STOP_EVENT
+            yield self._END_TURN_STOP_EVENT
+    
+    def _stream_bytes(self, request: Any) -> Iterator[bytes]:
+        """
+        与本类stream()相同的事件序列，但每个事件以JSON字节串输出，便于直接写入传输层
+        
+        内部方法：子类（如EnhancedAutoMockModel）会把stream改写为签名不同的异步生成器，
+        因此这里固定使用本类的同步stream()实现，不作为公开接口。
+        
+        Args:
+            request: 格式化的请求
             
-            yield {
-                "messageStop": {
-                    "stopReason": "end_turn"
-                }
-            }
+        Yields:
+            UTF-8编码的JSON事件
+        """
+        for event in AutoMockToolCallingModel.stream(self, request):
+            yield _dumps_bytes(event)
     
     def format_chunk(self, event: Dict[str, Any]) -> StreamEvent:
         """格式化响应块"""
@@ -387,6 +376,9 @@ class AutoMockToolCallingModel(Model):
     
     def update_config(self, **model_config) -> None:
         """更新模型配置"""
+        if "response_text" in model_config:
+            self.response_text = model_config.pop("response_text")
+            self._emit_text = bool(self.response_text)
         self.config.update(model_config)
     
     def get_config(self) -> Dict[str, Any]:
@@ -403,20 +395,77 @@ class AutoMockToolCallingModel(Model):
         yield {"output": None}
 
 
+def _extract_user_input(messages: Messages) -> str:
+    """
+    提取最后一条用户消息的文本，同时支持字典消息和带属性的消息对象
+
+    Args:
+        messages: 消息历史
+
+    Returns:
+        最后一条用户消息的文本，没有时返回空字符串
+    """
+    for msg in reversed(messages):
+        if isinstance(msg, dict):
+            # 字典消息：直接按键访问，缺少字段时跳过该消息
+            try:
+                if msg["role"] != "user":
+                    continue
+                content = msg["content"]
+            except KeyError:
+                continue
+
+            if isinstance(content, str):
+                return content
+            if isinstance(content, list):
+                for block in content:
+                    try:
+                        text = block["text"]
+                    except (KeyError, TypeError):
+                        continue
+                    if text:
+                        return text
+
+        elif getattr(msg, "role", None) == "user" and hasattr(msg, "content"):
+            # 消息对象：通过属性访问
+            content = msg.content
+            if isinstance(content, str):
+                return content
+            if isinstance(content, list):
+                for block in content:
+                    if hasattr(block, "text"):
+                        if block.text:
+                            return block.text
+                        break
+
+    return ""
+
+
+@lru_cache(maxsize=1)
+def _get_smart_generator():
+    """
+    获取进程内共享的SmartInputGenerator实例
+
+    SmartInputGenerator不持有与单次调用相关的状态，可以安全地在多个Agent之间复用，
+    避免每次创建UtilityAgent时重复导入模块和构建语义规则表。
+    """
+    # 导入新的智能生成器
+    from smart_input_generator import SmartInputGenerator
+
+    return SmartInputGenerator()
+
+
 def create_smart_input_generator() -> Callable:
     """
     创建智能输入生成器
-    
+
     使用新的基于语义分析的智能生成器，完全自动化，无硬编码
-    
+
     Returns:
         智能输入生成函数
     """
-    # 导入新的智能生成器
-    from smart_input_generator import SmartInputGenerator
-    
-    generator = SmartInputGenerator()
-    
+    generator = _get_smart_generator()
+
     def smart_input_generator(tool_info: Dict[str, Any], messages: Messages) -> Dict[str, Any]:
         """
         智能输入生成器
@@ -429,34 +478,8 @@ def create_smart_input_generator() -> Callable:
             生成的工具输入参数
         """
         # 提取最后一条用户消息
-        user_input = ""
-        for msg in reversed(messages):
-            if hasattr(msg, 'role') and msg.role == "user":
-                if hasattr(msg, 'content'):
-                    content = msg.content
-                    if isinstance(content, str):
-                        user_input = content
-                        break
-                    elif isinstance(content, list):
-                        for block in content:
-                            if hasattr(block, 'text'):
-                                user_input = block.text
-                                break
-                        if user_input:
-                            break
-            elif isinstance(msg, dict) and msg.get("role") == "user":
-                content = msg.get("content", [])
-                if isinstance(content, str):
-                    user_input = content
-                    break
-                elif isinstance(content, list):
-                    for block in content:
-                        if isinstance(block, dict) and block.get("text"):
-                            user_input = block["text"]
-                            break
-                    if user_input:
-                        break
-        
+        user_input = _extract_user_input(messages)
+
         # 使用智能生成器生成参数
         return generator.generate_input(tool_info, user_input)
     
@@ -10,40 +10,119 @@
 """
 
 import os
-import json
 import logging
+from collections import Counter
 from typing import Dict, Any, List, Optional, Callable, Union
 
 # 导入Strands相关库
 from strands import Agent, tool
 from strands.multiagent.graph import GraphBuilder
 from strands.session.file_session_manager import FileSessionManager
-from strands.session.ddb_session_manager import DDBSessionManager
-
-# 正确导入handoff_to_user工具
-from strands_tools import handoff_to_user
 
 import uuid
 
+from _json_compat import dumps as _dumps, loads as _loads
+from _keyword_scanner import compile_keyword_scanner
 from utility_agent import UtilityAgent
 
+
 # 设置日志
 logger = logging.getLogger(__name__)
 
 
+# 意图关键词表 - 模块级常量，避免每次调用工具时重新构建
+_INTENT_KEYWORDS = {
+    "general_inquiry": ["什么是", "怎么样", "有哪些", "介绍"],
+    "product_inquiry": ["产品", "价格", "功能", "规格", "配置"],
+    "complaint": ["投诉", "不满", "差评", "问题", "失望"],
+    "refund_request": ["退款", "退货", "取消订单", "不想要了", "返还"],
+    "technical_support": ["故障", "不工作", "错误", "修复", "帮助解决"]
+}
+
+# 情感词表
+_POSITIVE_WORDS = ("谢谢", "感谢", "满意", "好", "棒", "喜欢", "赞", "优秀")
+_NEGATIVE_WORDS = ("不满", "差", "糟糕", "失望", "退款", "投诉", "生气", "恼火", "垃圾")
+_EXTREME_NEGATIVE = ("非常不满", "极其失望", "太差了", "完全不行", "彻底失败")
+
+
+def _scan_keywords(scanner, text: str) -> set:
+    """单次扫描文本，返回命中的关键词集合"""
+    # 扫描器只有一个捕获组，findall直接返回关键词字符串，无需逐个构建Match对象
+    return set(scanner.findall(text))
+
+
+# 关键词 -> 意图 倒排索引（每个关键词只属于一种意图）
+_KEYWORD_TO_INTENT = {kw: intent for intent, kws in _INTENT_KEYWORDS.items() for kw in kws}
+
+# 预编译的关键词扫描器 - 在导入时构建一次，所有调用共享
+_INTENT_SCANNER = compile_keyword_scanner(_KEYWORD_TO_INTENT)
+
+# 情感词权重：积极 +1，负面 -1，极端负面 -3
+_SENTIMENT_WEIGHTS = {
+    **{word: 1 for word in _POSITIVE_WORDS},
+    **{word: -1 for word in _NEGATIVE_WORDS},
+    **{phrase: -3 for phrase in _EXTREME_NEGATIVE},
+}
+
+# 退款请求升级标记词 - 不计入情感分数，仅用于判断是否需要优先人工处理
+_ESCALATION_MARKERS = ("多次", "一直", "没有解决")
+
+_SENTIMENT_SCANNER = compile_keyword_scanner((*_SENTIMENT_WEIGHTS, *_ESCALATION_MARKERS))
+
+
+def _score_sentiment(found: set) -> tuple:
+    """根据命中的情感词计算情感分数
+
+    Args:
+        found: 扫描得到的关键词集合
+
+    Returns:
+        (情感分数, 是否退款请求, 是否多次退款未解决)
+    """
+    score = sum(_SENTIMENT_WEIGHTS.get(word, 0) for word in found)
+    is_refund = "退款" in found
+    is_escalated = is_refund and not found.isdisjoint(_ESCALATION_MARKERS)
+
+    # 对于包含"退款"的请求，强制设置为需要人工干预
+    if is_refund:
+        score = min(score - 2, -2)  # 确保退款请求被标记为负面
+
+    # 对于包含"退款"和"多次"或"一直"的请求，强制设置为需要人工干预
+    if is_escalated:
+        score = -5
+
+    return score, is_refund, is_escalated
+
+
+# 模拟知识库 - 意图类型 -> 标准回答及置信度
+_KNOWLEDGE_BASE = {
+    "general_inquiry": {
+        "response": "我们是一家专注于提供高质量产品和服务的公司。我们的客服团队7x24小时为您服务。",
+        "confidence": 0.9
+    },
+    "product_inquiry": {
+        "response": "我们的产品种类丰富，包括电子产品、家居用品和生活用品等。每件产品都有详细的规格说明和用户评价。",
+        "confidence": 0.85
+    },
+    "complaint": {
+        "response": "我们非常重视您的反馈，并致力于解决您遇到的问题。请提供更多细节，以便我们能更好地帮助您。",
+        "confidence": 0.8
+    },
+    "refund_request": {
+        "response": "根据我们的退款政策，购买后30天内未使用的产品可以申请全额退款。已使用的产品需要根据使用情况评估退款金额。",
+        "confidence": 0.9
+    },
+    "technical_support": {
+        "response": "对于技术问题，我们建议先查看产品说明书或访问我们的在线帮助中心。如果问题仍未解决，请联系技术支持团队。",
+        "confidence": 0.85
+    }
+}
+
+
 # 定义工具函数
 @tool
 def classify_intent(query: str) -> str:
     """分析用户意图，识别是咨询、投诉、退款请求等"""
-    intent_types = ["general_inquiry", "product_inquiry", "complaint", "refund_request", "technical_support"]
-    keywords = {
-        "general_inquiry": ["什么是", "怎么样", "有哪些", "介绍"],
-        "product_inquiry": ["产品", "价格", "功能", "规格", "配置"],
-        "complaint": ["投诉", "不满", "差评", "问题", "失望"],
-        "refund_request": ["退款", "退货", "取消订单", "不想要了", "返还"],
-        "technical_support": ["故障", "不工作", "错误", "修复", "帮助解决"]
-    }
-    
     # 默认为一般咨询
     result = {
         "intent": "general_inquiry",
@@ -52,19 +131,23 @@ def classify_intent(query: str) -> str:
         "complexity": "medium"
     }
     
-    # 检查每种意图的关键词
+    # 单次扫描查询文本，得到所有命中的关键词
+    found = _scan_keywords(_INTENT_SCANNER, query)
+
+    # 通过倒排索引统计每种意图命中的关键词数量
+    intent_counts = Counter(_KEYWORD_TO_INTENT[keyword] for keyword in found)
+
+    # 按意图定义顺序选出命中最多的意图（并列时保留靠前的意图）
     max_matches = 0
-    for intent, intent_keywords in keywords.items():
-        matches = sum(1 for keyword in intent_keywords if keyword in query)
+    for intent in _INTENT_KEYWORDS:
+        matches = intent_counts[intent]
         if matches > max_matches:
             max_matches = matches
             result["intent"] = intent
             result["confidence"] = min(0.5 + 0.1 * matches, 0.95)
-    
+
     # 提取匹配的关键词
-    for keyword in keywords[result["intent"]]:
-        if keyword in query:
-            result["keywords"].append(keyword)
+    result["keywords"] = [keyword for keyword in _INTENT_KEYWORDS[result["intent"]] if keyword in found]
     
     # 判断复杂度
     if len(query) > 100 or "复杂" in query or "多个问题" in query:
@@ -72,37 +155,14 @@ def classify_intent(query: str) -> str:
     elif len(query) < 20 and max_matches <= 1:
         result["complexity"] = "low"
     
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(result)
 
 
 @tool
 def analyze_sentiment(query: str) -> str:
     """分析用户情绪，判断是积极、中性还是负面"""
-    positive_words = ["谢谢", "感谢", "满意", "好", "棒", "喜欢", "赞", "优秀"]
-    negative_words = ["不满", "差", "糟糕", "失望", "退款", "投诉", "生气", "恼火", "垃圾"]
-    extreme_negative = ["非常不满", "极其失望", "太差了", "完全不行", "彻底失败"]
-    
-    # 计算情感分数
-    sentiment_score = 0
-    for word in positive_words:
-        if word in query:
-            sentiment_score += 1
-    
-    for word in negative_words:
-        if word in query:
-            sentiment_score -= 1
-    
-    for phrase in extreme_negative:
-        if phrase in query:
-            sentiment_score -= 3
-    
-    # 对于包含"退款"的请求，强制设置为需要人工干预
-    if "退款" in query:
-        sentiment_score = min(sentiment_score - 2, -2)  # 确保退款请求被标记为负面
-    
-    # 对于包含"退款"和"多次"或"一直"的请求，强制设置为需要人工干预
-    if "退款" in query and ("多次" in query or "一直" in query or "没有解决" in query):
-        sentiment_score = -5
+    # 计算情感分数 - 单次扫描得到所有命中的情感词和退款标记
+    sentiment_score, is_refund, is_escalated = _score_sentiment(_scan_keywords(_SENTIMENT_SCANNER, query))
     
     # 确定情感类别
     if sentiment_score >= 2:
@@ -117,13 +177,13 @@ def analyze_sentiment(query: str) -> str:
     reason = ""
     if sentiment_score <= -2:
         requires_human = True
-        if "退款" in query:
+        if is_refund:
             reason = "用户提出退款要求，需要人工客服处理退款流程"
         else:
             reason = "用户情绪负面，建议人工客服介入"
     
     # 对于包含"退款"和"多次"或"一直"的请求，强制设置为需要人工干预
-    if "退款" in query and ("多次" in query or "一直" in query or "没有解决" in query):
+    if is_escalated:
         requires_human = True
         reason = "用户多次请求退款未得到解决，需要人工客服优先处理"
     
@@ -134,47 +194,24 @@ def analyze_sentiment(query: str) -> str:
         "reason": reason
     }
     
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(result)
 
 @tool
 def retrieve_knowledge(query: str, intent: str) -> str:
     """从知识库中检索相关信息"""
-    # 模拟知识库查询
-    knowledge_base = {
-        "general_inquiry": {
-            "response": "我们是一家专注于提供高质量产品和服务的公司。我们的客服团队7x24小时为您服务。",
-            "confidence": 0.9
-        },
-        "product_inquiry": {
-            "response": "我们的产品种类丰富，包括电子产品、家居用品和生活用品等。每件产品都有详细的规格说明和用户评价。",
-            "confidence": 0.85
-        },
-        "complaint": {
-            "response": "我们非常重视您的反馈，并致力于解决您遇到的问题。请提供更多细节，以便我们能更好地帮助您。",
-            "confidence": 0.8
-        },
-        "refund_request": {
-            "response": "根据我们的退款政策，购买后30天内未使用的产品可以申请全额退款。已使用的产品需要根据使用情况评估退款金额。",
-            "confidence": 0.9
-        },
-        "technical_support": {
-            "response": "对于技术问题，我们建议先查看产品说明书或访问我们的在线帮助中心。如果问题仍未解决，请联系技术支持团队。",
-            "confidence": 0.85
-        }
-    }
-    
-    # 解析意图
+    # 解析意图 - 只处理JSON解析失败，非对象的JSON视为一般咨询
     try:
-        intent_data = json.loads(intent)
-        intent_type = intent_data.get("intent", "general_inquiry")
-    except:
-        intent_type = "general_inquiry"
+        intent_data = _loads(intent)
+    except (ValueError, TypeError):
+        intent_data = None
+    intent_type = intent_data.get("intent", "general_inquiry") if isinstance(intent_data, dict) else "general_inquiry"
     
     # 检查是否有匹配的知识
-    if intent_type in knowledge_base:
+    knowledge = _KNOWLEDGE_BASE.get(intent_type)
+    if knowledge is not None:
         knowledge_found = True
-        response = knowledge_base[intent_type]["response"]
-        confidence = knowledge_base[intent_type]["confidence"]
+        response = knowledge["response"]
+        confidence = knowledge["confidence"]
     else:
         knowledge_found = False
         response = "抱歉，我没有找到与您问题相关的信息。"
@@ -195,7 +232,7 @@ def retrieve_knowledge(query: str, intent: str) -> str:
         "reason": reason
     }
     
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(result)
 
 
 def create_session_manager(session_id, use_ddb=False):
@@ -209,6 +246,9 @@ def create_session_manager(session_id, use_ddb=False):
         会话管理器实例
     """
     if use_ddb:
+        # 延迟导入：只有使用DynamoDB时才加载boto3相关依赖
+        from strands.session.ddb_session_manager import DDBSessionManager
+
         # 使用环境变量或默认值配置DynamoDB
         table_name = os.environ.get("DDB_SESSION_TABLE", "strands-sessions")
         region_name = os.environ.get("AWS_REGION", "us-west-2")
@@ -232,6 +272,9 @@ def create_customer_service_workflow(session_id=None, use_ddb=False):
         use_ddb: 是否使用DynamoDB作为存储后端
     """
     
+    # 延迟导入handoff_to_user工具，仅在构建人工交接代理时才需要strands_tools
+    from strands_tools import handoff_to_user
+
     # 如果没有提供会话ID，则生成一个新的
     if session_id is None:
         session_id = f"customer-service-{uuid.uuid4()}"
@@ -16,16 +16,27 @@
 - 实时状态处理：在节点执行时立即处理状态
 """
 
-import time
-import json
-from typing import Dict, Any, List, Optional, Callable
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from heapq import nlargest
+from operator import itemgetter
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Callable
 
 # Strands imports
 from strands import Agent, tool
 
-# Local imports
-from utility_agent_standalone import create_utility_agent
-from stateful_graph import StatefulGraphBuilder, StateManager, UserInteractionRequiredException
+from _json_compat import dumps as _dumps, dumps_pretty as _dumps_pretty, print_pretty as _print_pretty
+from _keyword_scanner import compile_any_keyword, compile_keyword_scanner
+
+# Local imports - 图相关模块（连同strands.multiagent、Mock模型等）只在构建或执行图时才需要，
+# 延迟到使用处导入，只使用工具函数时不必加载
+if TYPE_CHECKING:
+    from stateful_graph import StateManager
+
 
 class UnifiedAgentState:
     """统一的Agent状态字段定义 - 极简设计，只有状态字段映射
@@ -39,9 +50,13 @@ class UnifiedAgentState:
     注意：如果你需要复杂的状态验证逻辑，建议使用标准的Graph而不是StatefulGraph
     """
     
+    # 只作为类级别配置使用，不创建实例属性
+    __slots__ = ()
+    
     # 统一的状态字段映射 - JSON字段名 -> agent.state字段名
     # 注意：只包含需要在Agent间传递的核心状态字段
-    UNIFIED_STATE_MAPPING = {
+    # 使用只读映射，运行时不允许修改
+    UNIFIED_STATE_MAPPING = MappingProxyType({
         # 状态机关键字段 - 影响Graph路由（必需）
         "stage": "stage",                         # 当前执行的Agent名称
         "status": "status",                       # 当前执行状态 (Success, Failed, Processing)
@@ -58,46 +73,231 @@ class UnifiedAgentState:
         "booking_id": "booking_id",               # 订单ID
         "activity_id": "activity_id",             # 活动ID
         "contact_reason": "contact_reason",       # 联系原因
-    }
+    })
+
+
+# 条件函数在每次边检查时都会执行，调试信息通过logger.debug输出，未开启DEBUG级别时不会格式化
+logger = logging.getLogger(__name__)
+
+
+# ==================== 关键词匹配 ====================
+
+# 强制点击事件的关键词（单独出现时必须识别为点击）
+_FORCE_CLICK_RE = compile_any_keyword((
+    "帮助", "退款", "投诉", "查询", "联系客服", "人工客服",
+    "help", "refund", "complaint", "query", "contact"
+))
+
+# 点击流的特征
+_CLICK_PATTERNS = frozenset({
+    "点击", "选择", "按钮", "菜单", "选项",
+    "预订", "查看订单", "联系客服", "帮助", "退款", "投诉",
+    "查询订单", "订单状态", "客服", "人工", "转人工",
+    "booking", "order", "help", "contact", "refund", "complaint"
+})
+
+# 自由文本的特征
+_CHAT_PATTERNS = frozenset({
+    "我想", "请问", "怎么", "为什么", "什么时候",
+    "帮我", "能否", "可以", "希望", "需要", "请告诉我",
+    "我需要了解", "想知道", "有什么", "推荐"
+})
+
+# 点击流和自由文本特征共用一个扫描器，一次扫描同时得到两类特征的命中
+_EVENT_SCANNER = compile_keyword_scanner(_CLICK_PATTERNS | _CHAT_PATTERNS)
+
+# 高优先级关键词
+_URGENT_RE = compile_any_keyword((
+    "紧急", "急", "马上", "立即", "重要", "严重",
+    "urgent", "emergency", "asap", "critical"
+))
+
+# 服务类型 -> 关键词，用于分析用户输入中可能的服务类型
+_SERVICE_KEYWORDS = {
+    "订单查询": ("订单", "查询", "状态", "物流", "配送", "order"),
+    "退款退货": ("退款", "退货", "返回", "refund", "return"),
+    "产品咨询": ("产品", "功能", "规格", "价格", "咨询", "product"),
+    "技术支持": ("技术", "故障", "问题", "bug", "support", "technical"),
+    "投诉建议": ("投诉", "建议", "意见", "complaint", "feedback"),
+    "账户问题": ("账户", "登录", "密码", "个人信息", "account", "login")
+}
+
+# 全部服务类型，按定义顺序
+_ALL_SERVICES = tuple(_SERVICE_KEYWORDS)
+
+# 关键词 -> 服务类型 倒排索引（每个关键词只属于一种服务类型）
+_KEYWORD_TO_SERVICE = {kw: service for service, kws in _SERVICE_KEYWORDS.items() for kw in kws}
+
+# 所有服务类型关键词的单次扫描器
+_SERVICE_SCANNER = compile_keyword_scanner(_KEYWORD_TO_SERVICE)
+
+# 根据服务类型预设优先级
+_SERVICE_PRIORITY_MAP = {
+    "退款退货": "high",
+    "投诉建议": "high",
+    "技术支持": "medium",
+    "订单查询": "medium",
+    "产品咨询": "low",
+    "账户问题": "medium"
+}
+
+# 优先级描述
+_PRIORITY_DESCRIPTIONS = {
+    "high": "高优先级 - 将优先处理，预计2-5分钟内响应",
+    "medium": "中优先级 - 正常处理，预计10-15分钟内响应",
+    "low": "低优先级 - 按顺序处理，预计30分钟内响应"
+}
+
+# 优先级确认选项 - 只取决于建议的优先级，按建议优先级预先生成
+_PRIORITY_OPTIONS = {
+    priority: (
+        f"确认 - {description}",
+        f"高优先级 - {_PRIORITY_DESCRIPTIONS['high']}",
+        f"中优先级 - {_PRIORITY_DESCRIPTIONS['medium']}",
+        f"低优先级 - {_PRIORITY_DESCRIPTIONS['low']}"
+    )
+    for priority, description in _PRIORITY_DESCRIPTIONS.items()
+}
+
+# 优先级确认消息模板 - 每个建议优先级预先填好描述，调用时只需填入服务类型
+_PRIORITY_MESSAGE_TEMPLATES = {
+    priority: f"根据您选择的服务类型「{{service_type}}」，我们建议设置为{description}。请确认或选择其他优先级："
+    for priority, description in _PRIORITY_DESCRIPTIONS.items()
+}
+
+# 人工转接规则（按优先顺序）：(关键词, 消息类型, 转接消息, 优先级)
+_TRANSFER_RULES = (
+    (("退款",), "refund", "您的退款请求需要专业客服处理，我正在为您转接到退款专员。", "high"),
+    (("投诉", "不满意"), "complaint", "我理解您的不满，为了更好地解决您的问题，我将为您转接到客服主管。", "high"),
+    (("技术问题", "系统故障"), "technical", "您遇到的技术问题需要专业技术支持，我正在为您转接到技术客服。", "medium"),
+)
+
+# 未命中任何规则时的通用转接：(消息类型, 转接消息, 优先级)
+_GENERAL_TRANSFER = ("general", "为了更好地为您服务，我将为您转接到人工客服。", "medium")
+
+# 转接关键词 -> 规则序号；各关键词之间没有重叠字符，多选正则的findall可以找出全部命中
+_TRANSFER_KEYWORD_TO_RULE = {kw: index for index, rule in enumerate(_TRANSFER_RULES) for kw in rule[0]}
+_TRANSFER_RE = compile_any_keyword(_TRANSFER_KEYWORD_TO_RULE)
+
+# 转接优先级 -> 预计等待时间
+_TRANSFER_WAIT_TIMES = {
+    "high": "预计等待时间2-5分钟",
+    "medium": "预计等待时间5-10分钟"
+}
+
+# 纯PE Agent共用的系统提示词前缀 - 必须是每个系统提示词的开头且不含动态内容，
+# 使模型服务的前缀缓存可以在同一请求的多次LLM调用之间复用
+_SHARED_SYSTEM_PROMPT_PREFIX = """你是多Agent客户服务工作流中的一个Agent，各Agent通过JSON输出中的状态字段驱动工作流流转。
+
+**通用输出要求：**
+1. 只输出一个严格的JSON对象，不要添加其他文字
+2. 必须包含 stage（当前Agent名称）和 status（Success/Failed/Processing）字段
+3. confidence 取值范围为 0.0-1.0
+
+以下是你的角色说明：
+
+"""
+
+# 路由决策Agent - 判断是否需要人工干预
+_ROUTE_SYSTEM_PROMPT = _SHARED_SYSTEM_PROMPT_PREFIX + """你是一个智能路由决策专家。请分析用户查询和前面Agent的分析结果，判断是否需要人工干预。
+
+**重要：请检查状态中的selected_service_type和user_priority_level字段！**
+
+**分析规则（严格执行）：**
+1. 如果selected_service_type是"投诉建议"或"退款退货" → requires_human: true
+2. 如果user_priority_level是"high" → requires_human: true  
+3. 包含"经理"、"主管"、"人工客服"、"转人工" → requires_human: true
+4. 包含"多次"、"一直"、"反复"、"没有解决"、"无法处理" → requires_human: true
+5. 其他一般咨询和简单问题 → requires_human: false
+
+**输出格式（严格按照统一业务字段）：**
+```json
+{
+  "subject_type": "booking/activity/other",
+  "requires_human": true/false,
+  "confidence": 0.0-1.0,
+  "contact_reason": "用户联系的具体原因",
+  "stage": "route_agent",
+  "status": "Success"
+}
+```
+
+**示例：**
+- 如果selected_service_type="投诉建议" → requires_human: true
+- 如果selected_service_type="产品咨询" 且 user_priority_level="low" → requires_human: false
+
+请直接输出JSON，不要添加其他文字。"""
+
+# 意图分析Agent - 提取业务信息和实体
+_INTENT_SYSTEM_PROMPT = _SHARED_SYSTEM_PROMPT_PREFIX + """你是一个用户意图分析专家。请深入分析用户查询，提取关键业务信息和实体。
+
+**主要任务：**
+1. 识别主题类型 (subject_type)
+2. 提取订单ID (booking_id) 和活动ID (activity_id)
+3. 提取其他相关实体信息
+4. 评估分析的置信度
+
+**输出格式（严格按照统一业务字段）：**
+```json
+{
+  "subject_type": "booking/activity/other",
+  "booking_id": "提取的订单号(如果有)",
+  "activity_id": "提取的活动ID(如果有)",
+  "intent_type": "具体的意图类型",
+  "confidence": 0.0-1.0,
+  "stage": "intent_agent",
+  "status": "Success"
+}
+```
+
+请直接输出JSON，不要添加其他文字。"""
+
+# 最终回答Agent - 生成客服回答
+_ANSWER_SYSTEM_PROMPT = _SHARED_SYSTEM_PROMPT_PREFIX + """你是一个专业的客服回答生成专家。请基于用户查询和前面Agent的分析结果生成最终回答。
+
+**输出格式（严格按照统一业务字段）：**
+```json
+{
+  "response": "专业的客服回答内容",
+  "subject_type": "booking/activity/other",
+  "confidence": 0.0-1.0,
+  "stage": "answer_agent",
+  "status": "Success"
+}
+```
+
+请直接输出JSON，不要添加其他文字。"""
 
 
 # ==================== 工具函数 ====================
 
+# 工具结果只取决于入参，且返回不可变的JSON字符串，按入参缓存；
+# 界面上的常用点击词（如"退款"、"投诉"）重复出现时无需重新扫描和序列化
+_TOOL_RESULT_CACHE_SIZE = 1024
+
+
 @tool
 def analyze_event_type(user_input: str) -> str:
     """分析用户输入的事件类型，区分点击流还是自由文本"""
+    return _analyze_event_type(user_input)
+
+
+@lru_cache(maxsize=_TOOL_RESULT_CACHE_SIZE)
+def _analyze_event_type(user_input: str) -> str:
+    """analyze_event_type的实现"""
     
-    # 强制点击事件的关键词（单独出现时必须识别为点击）
-    force_click_keywords = [
-        "帮助", "退款", "投诉", "查询", "联系客服", "人工客服",
-        "help", "refund", "complaint", "query", "contact"
-    ]
-    
-    # 点击流的特征
-    click_patterns = [
-        "点击", "选择", "按钮", "菜单", "选项",
-        "预订", "查看订单", "联系客服", "帮助", "退款", "投诉",
-        "查询订单", "订单状态", "客服", "人工", "转人工",
-        "booking", "order", "help", "contact", "refund", "complaint"
-    ]
-    
-    # 自由文本的特征
-    chat_patterns = [
-        "我想", "请问", "怎么", "为什么", "什么时候",
-        "帮我", "能否", "可以", "希望", "需要", "请告诉我",
-        "我需要了解", "想知道", "有什么", "推荐"
-    ]
-    
-    # 分析输入长度和内容
+    # 分析输入长度和内容 - 只做一次小写转换
+    # 关键词都不含空白字符，首尾空白不影响匹配结果，无需额外strip()
     input_length = len(user_input)
-    user_input_lower = user_input.lower().strip()
+    user_input_lower = user_input.lower()
     
     # 检查是否是强制点击关键词
-    is_force_click = any(keyword in user_input_lower for keyword in force_click_keywords)
+    is_force_click = _FORCE_CLICK_RE.search(user_input_lower) is not None
     
-    # 计算匹配分数
-    click_score = sum(1 for pattern in click_patterns if pattern in user_input_lower)
-    chat_score = sum(1 for pattern in chat_patterns if pattern in user_input_lower)
+    # 计算匹配分数 - 单次扫描后按特征类别统计命中数
+    found = set(_EVENT_SCANNER.findall(user_input_lower))
+    click_score = len(found & _CLICK_PATTERNS)
+    chat_score = len(found & _CHAT_PATTERNS)
     
     # 决策逻辑（优化后）
     if is_force_click and input_length <= 15:
@@ -132,43 +332,37 @@ def analyze_event_type(user_input: str) -> str:
         "status": "Success"
     }
     
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(result)
 
 
 @tool
 def detect_service_type(user_input: str) -> str:
     """检测用户查询的服务类型，并提供选项供用户选择"""
+    return _detect_service_type(user_input)
+
+
+@lru_cache(maxsize=_TOOL_RESULT_CACHE_SIZE)
+def _detect_service_type(user_input: str) -> str:
+    """detect_service_type的实现"""
     
-    # 分析用户输入，提取可能的服务类型
-    service_keywords = {
-        "订单查询": ["订单", "查询", "状态", "物流", "配送", "order"],
-        "退款退货": ["退款", "退货", "返回", "refund", "return"],
-        "产品咨询": ["产品", "功能", "规格", "价格", "咨询", "product"],
-        "技术支持": ["技术", "故障", "问题", "bug", "support", "technical"],
-        "投诉建议": ["投诉", "建议", "意见", "complaint", "feedback"],
-        "账户问题": ["账户", "登录", "密码", "个人信息", "account", "login"]
-    }
-    
-    # 计算每个服务类型的匹配分数
-    scores = {}
-    for service_type, keywords in service_keywords.items():
-        score = sum(1 for keyword in keywords if keyword in user_input.lower())
-        if score > 0:
-            scores[service_type] = score
+    # 计算每个服务类型的匹配分数 - 单次扫描所有关键词，再按倒排索引归到服务类型
+    found = set(_SERVICE_SCANNER.findall(user_input.lower()))
+    counts = Counter(_KEYWORD_TO_SERVICE[keyword] for keyword in found)
+    # 按服务类型定义顺序保存命中的服务，排序并列时保持原有顺序
+    scores = {service: counts[service] for service in _ALL_SERVICES if counts[service]}
     
     # 根据匹配情况生成选项
     if scores:
-        # 按分数排序，取前3个
-        sorted_services = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:3]
+        # 按分数取前3个（与稳定排序后切片结果一致，并列时保持原有顺序）
+        sorted_services = nlargest(3, scores.items(), key=itemgetter(1))
         recommended_services = [service for service, _ in sorted_services]
         
         # 添加其他选项
-        all_services = list(service_keywords.keys())
-        other_services = [s for s in all_services if s not in recommended_services]
+        other_services = [s for s in _ALL_SERVICES if s not in recommended_services]
         options = recommended_services + other_services[:3]
     else:
         # 如果没有明确匹配，提供所有选项
-        options = list(service_keywords.keys())
+        options = list(_ALL_SERVICES)
     
     result = {
         "message": "请选择您需要的服务类型，以便我们为您提供更精准的帮助：",
@@ -179,90 +373,65 @@ def detect_service_type(user_input: str) -> str:
         "status": "Success"
     }
     
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(result)
 
 
 @tool
-def determine_priority(user_input: str = "") -> str:
+def determine_priority(user_input: str = "", agent: Optional[Agent] = None) -> str:
     """根据服务类型和用户输入确定优先级，需要用户确认"""
     
-    # 从全局状态获取服务类型（这个会在条件函数中设置）
-    # 这里使用默认值，实际会通过Agent的state获取
-    service_type = "技术支持"  # 默认值
+    # 从Agent的state获取服务类型（由条件函数写入全局状态，节点执行前注入到Agent.state）
+    service_type = agent.state.get("selected_service_type") if agent is not None else None
+    if not service_type:
+        service_type = "技术支持"  # 默认值
     
-    # 高优先级关键词
-    high_priority_keywords = [
-        "紧急", "急", "马上", "立即", "重要", "严重",
-        "urgent", "emergency", "asap", "critical"
-    ]
-    
-    # 根据服务类型预设优先级
-    service_priority_map = {
-        "退款退货": "high",
-        "投诉建议": "high", 
-        "技术支持": "medium",
-        "订单查询": "medium",
-        "产品咨询": "low",
-        "账户问题": "medium"
-    }
+    return _determine_priority(user_input, service_type)
+
+
+@lru_cache(maxsize=_TOOL_RESULT_CACHE_SIZE)
+def _determine_priority(user_input: str, service_type: str) -> str:
+    """determine_priority的实现 - 服务类型由调用方从Agent.state中读出"""
     
     # 检查用户输入中的紧急关键词
-    has_urgent_keywords = any(keyword in user_input.lower() for keyword in high_priority_keywords)
+    has_urgent_keywords = _URGENT_RE.search(user_input.lower()) is not None
     
     # 确定建议的优先级
-    suggested_priority = service_priority_map.get(service_type, "medium")
+    suggested_priority = _SERVICE_PRIORITY_MAP.get(service_type, "medium")
     if has_urgent_keywords:
         suggested_priority = "high"
     
-    # 优先级描述
-    priority_descriptions = {
-        "high": "高优先级 - 将优先处理，预计2-5分钟内响应",
-        "medium": "中优先级 - 正常处理，预计10-15分钟内响应", 
-        "low": "低优先级 - 按顺序处理，预计30分钟内响应"
-    }
-    
     result = {
-        "message": f"根据您选择的服务类型「{service_type}」，我们建议设置为{priority_descriptions[suggested_priority]}。请确认或选择其他优先级：",
+        "message": _PRIORITY_MESSAGE_TEMPLATES[suggested_priority].format(service_type=service_type),
         "suggested_priority": suggested_priority,
-        "options": [
-            f"确认 - {priority_descriptions[suggested_priority]}",
-            f"高优先级 - {priority_descriptions['high']}", 
-            f"中优先级 - {priority_descriptions['medium']}",
-            f"低优先级 - {priority_descriptions['low']}"
-        ],
+        "options": _PRIORITY_OPTIONS[suggested_priority],
         "service_type": service_type,
         "requires_user_confirmation": True,
         "stage": "priority_confirmer",
         "status": "Success"
     }
     
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(result)
 
 
 @tool
 def generate_transfer_message(user_query: str) -> str:
     """生成人工转接消息"""
+    return _generate_transfer_message(user_query)
+
+
+@lru_cache(maxsize=_TOOL_RESULT_CACHE_SIZE)
+def _generate_transfer_message(user_query: str) -> str:
+    """generate_transfer_message的实现"""
     
-    # 根据查询内容生成个性化消息
-    if "退款" in user_query:
-        message_type = "refund"
-        message = "您的退款请求需要专业客服处理，我正在为您转接到退款专员。"
-        priority = "high"
-    elif "投诉" in user_query or "不满意" in user_query:
-        message_type = "complaint"
-        message = "我理解您的不满，为了更好地解决您的问题，我将为您转接到客服主管。"
-        priority = "high"
-    elif "技术问题" in user_query or "系统故障" in user_query:
-        message_type = "technical"
-        message = "您遇到的技术问题需要专业技术支持，我正在为您转接到技术客服。"
-        priority = "medium"
+    # 根据查询内容生成个性化消息 - 单次扫描所有转接关键词，命中多条规则时取表中靠前的规则
+    matched_rules = [_TRANSFER_KEYWORD_TO_RULE[keyword] for keyword in _TRANSFER_RE.findall(user_query)]
+    if matched_rules:
+        message_type, message, priority = _TRANSFER_RULES[min(matched_rules)][1:]
     else:
-        message_type = "general"
-        message = "为了更好地为您服务，我将为您转接到人工客服。"
-        priority = "medium"
+        message_type, message, priority = _GENERAL_TRANSFER
     
     # 添加等待时间估计
-    wait_time = "预计等待时间2-5分钟" if priority == "high" else "预计等待时间5-10分钟"
+    wait_time = _TRANSFER_WAIT_TIMES[priority]
     
     result = {
         "message": message,
@@ -273,19 +442,81 @@ def generate_transfer_message(user_query: str) -> str:
         "status": "Success"
     }
     
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(result)
+
+
+# ==================== 路由决策 ====================
+
+# 高优先级服务类型 - 点击流程中选择这些服务时需要人工干预
+_HIGH_PRIORITY_SERVICES = frozenset({"退款退货", "投诉建议"})
+
+
+def _click_route_decision(state_manager: "StateManager") -> Optional[tuple]:
+    """点击流程的路由决策 - 一次状态读取同时得出人工干预或自动处理的结论
+    
+    解析用户确认的优先级并写入全局状态的user_priority_level（重复调用结果相同）。
+    
+    Args:
+        state_manager: 状态管理器
+        
+    Returns:
+        (是否需要人工干预, 服务类型, 用户优先级)，用户尚未确认优先级时返回None
+    """
+    global_state = state_manager.global_state
+    user_input_data = global_state.get("priority_confirmer_user_input")
+    if not user_input_data:
+        return None
+    
+    user_confirmation = user_input_data.get("input")
+    # 使用转换后的服务类型名称
+    service_type = global_state.get("selected_service_type", "")
+    
+    # 解析用户选择的优先级
+    is_high_selection = "高优先级" in user_confirmation or "确认" in user_confirmation
+    if is_high_selection:
+        global_state["user_priority_level"] = "high"
+    elif "中优先级" in user_confirmation:
+        global_state["user_priority_level"] = "medium"
+    elif "低优先级" in user_confirmation:
+        global_state["user_priority_level"] = "low"
+    
+    user_priority_level = global_state.get("user_priority_level")
+    
+    # 1. 明确的高优先级选择 2. 高优先级服务类型 -> 需要人工干预
+    needs_human = (user_priority_level == "high" or is_high_selection
+                   or service_type in _HIGH_PRIORITY_SERVICES)
+    
+    return needs_human, service_type, user_priority_level
 
 
 # ==================== 多Agent工作流管理器 ====================
 
 class MultiAgentCustomerService:
-    """多Agent客户服务系统管理器 - 基于StatefulGraph的简化实现"""
+    """多Agent客户服务系统管理器 - 基于StatefulGraph的简化实现
     
-    def __init__(self):
-        self.graph = self._create_graph()
+    图带有单次执行的运行时状态（StateManager、各Agent的对话历史、Agent.state和Mock模型计数），
+    每次execute/execute_interactive开始时都会reset()。因此：
+    - 默认每个实例构建自己的图，一个实例同一时间只处理一个请求，多个实例可以并发执行
+    - reuse_graph=True时所有这样创建的实例共用进程内同一个图，省去构建开销，
+      但这些实例之间不能并发执行，也不能在另一个实例等待用户输入时开始新的请求
+    """
+    
+    # 实例只持有图，固定属性布局，不创建__dict__
+    __slots__ = ("graph",)
     
-    def _create_graph(self):
+    def __init__(self, reuse_graph: bool = False):
+        """
+        Args:
+            reuse_graph: 是否复用进程内共享的图（见类说明）。仅在确定同一时间只有一个请求
+                使用该图时开启，例如单线程的命令行演示
+        """
+        self.graph = _get_shared_graph() if reuse_graph else self._create_graph()
+    
+    @staticmethod
+    def _create_graph():
         """创建多Agent图 - 包含用户交互的UtilityAgent"""
+        from utility_agent_standalone import create_utility_agent
+        from stateful_graph import StatefulGraphBuilder, StateManager
         
         # 创建StatefulGraphBuilder
         builder = StatefulGraphBuilder()
@@ -309,92 +540,26 @@ class MultiAgentCustomerService:
         service_selector_node = builder.add_node(service_selector, "service_selector")
         
         # 3. Priority Confirmer UtilityAgent - 优先级确认 (需要用户交互)
-        # 创建一个特殊的Agent，能够访问状态中的服务类型
-        priority_confirmer = Agent(
+        # determine_priority通过Agent.state读取用户选择的服务类型，无需LLM推理
+        priority_confirmer = create_utility_agent(
+            tools=[determine_priority],
             name="优先级确认Agent",
-            system_prompt="""你是一个优先级确认专家。请根据用户选择的服务类型确定优先级，并提供选项供用户确认。
-
-**任务：**
-1. 从状态中获取用户选择的服务类型
-2. 根据服务类型建议优先级
-3. 提供选项供用户确认
-
-**输出格式：**
-```json
-{
-  "message": "根据您选择的服务类型，我们建议设置优先级。请确认或选择其他优先级：",
-  "suggested_priority": "high/medium/low",
-  "options": ["确认 - 高优先级", "高优先级", "中优先级", "低优先级"],
-  "service_type": "用户选择的服务类型",
-  "requires_user_confirmation": true,
-  "stage": "priority_confirmer",
-  "status": "Success"
-}
-```
-
-请直接输出JSON，不要添加其他文字。"""
+            preferred_tool="determine_priority",
+            response_text="正在根据您选择的服务类型确定优先级..."
         )
         priority_confirmer_node = builder.add_node(priority_confirmer, "priority_confirmer")
         
         # 4. Route Agent - 路由决策 (纯PE，无工具，无人工干预)
         route_agent = Agent(
             name="路由决策Agent",
-            system_prompt="""你是一个智能路由决策专家。请分析用户查询和前面Agent的分析结果，判断是否需要人工干预。
-
-**重要：请检查状态中的selected_service_type和user_priority_level字段！**
-
-**分析规则（严格执行）：**
-1. 如果selected_service_type是"投诉建议"或"退款退货" → requires_human: true
-2. 如果user_priority_level是"high" → requires_human: true  
-3. 包含"经理"、"主管"、"人工客服"、"转人工" → requires_human: true
-4. 包含"多次"、"一直"、"反复"、"没有解决"、"无法处理" → requires_human: true
-5. 其他一般咨询和简单问题 → requires_human: false
-
-**输出格式（严格按照统一业务字段）：**
-```json
-{
-  "subject_type": "booking/activity/other",
-  "requires_human": true/false,
-  "confidence": 0.0-1.0,
-  "contact_reason": "用户联系的具体原因",
-  "stage": "route_agent",
-  "status": "Success"
-}
-```
-
-**示例：**
-- 如果selected_service_type="投诉建议" → requires_human: true
-- 如果selected_service_type="产品咨询" 且 user_priority_level="low" → requires_human: false
-
-请直接输出JSON，不要添加其他文字。"""
+            system_prompt=_ROUTE_SYSTEM_PROMPT
         )
         route_node = builder.add_node(route_agent, "route_agent")
         
         # 5. Intent Agent - 意图分析 (纯PE，无工具)
         intent_agent = Agent(
             name="意图分析Agent",
-            system_prompt="""你是一个用户意图分析专家。请深入分析用户查询，提取关键业务信息和实体。
-
-**主要任务：**
-1. 识别主题类型 (subject_type)
-2. 提取订单ID (booking_id) 和活动ID (activity_id)
-3. 提取其他相关实体信息
-4. 评估分析的置信度
-
-**输出格式（严格按照统一业务字段）：**
-```json
-{
-  "subject_type": "booking/activity/other",
-  "booking_id": "提取的订单号(如果有)",
-  "activity_id": "提取的活动ID(如果有)",
-  "intent_type": "具体的意图类型",
-  "confidence": 0.0-1.0,
-  "stage": "intent_agent",
-  "status": "Success"
-}
-```
-
-请直接输出JSON，不要添加其他文字。"""
+            system_prompt=_INTENT_SYSTEM_PROMPT
         )
         intent_node = builder.add_node(intent_agent, "intent_agent")
         
@@ -410,20 +575,7 @@ class MultiAgentCustomerService:
         # 7. Answer Agent - 最终回答 (纯PE，无工具)
         answer_agent = Agent(
             name="最终回答Agent",
-            system_prompt="""你是一个专业的客服回答生成专家。请基于用户查询和前面Agent的分析结果生成最终回答。
-
-**输出格式（严格按照统一业务字段）：**
-```json
-{
-  "response": "专业的客服回答内容",
-  "subject_type": "booking/activity/other",
-  "confidence": 0.0-1.0,
-  "stage": "answer_agent",
-  "status": "Success"
-}
-```
-
-请直接输出JSON，不要添加其他文字。"""
+            system_prompt=_ANSWER_SYSTEM_PROMPT
         )
         answer_node = builder.add_node(answer_agent, "answer_agent")
         
@@ -432,29 +584,29 @@ class MultiAgentCustomerService:
         # 主流程分支：根据事件类型决定路径
         def is_click_event(state_manager: StateManager) -> bool:
             """检查是否为点击事件 - 需要用户交互流程"""
-            event_type = state_manager.get_state("event_type")
-            stage = state_manager.get_state("stage")
-            status = state_manager.get_state("status")
+            # 绑定全局状态字典，一次属性查找后直接按键读取
+            state = state_manager.global_state
+            # 绝大多数检查发生在其他节点完成后，阶段不匹配时直接返回，不再读取业务字段
+            if state.get("stage") != "entry_agent" or state.get("status") != "Success":
+                return False
             
-            print(f"     🖱️  点击事件检查: event_type={event_type}, stage={stage}, status={status}")
+            event_type = state.get("event_type")
+            logger.debug("event_type=<%s> | 点击事件检查", event_type)
             
             # 点击事件需要通过服务选择和优先级确认流程
-            return (stage == "entry_agent" and 
-                    status == "Success" and 
-                    event_type == "click")
+            return event_type == "click"
         
         def is_chat_event(state_manager: StateManager) -> bool:
             """检查是否为自由文本事件 - 直接进入路由决策"""
-            event_type = state_manager.get_state("event_type")
-            stage = state_manager.get_state("stage")
-            status = state_manager.get_state("status")
+            state = state_manager.global_state
+            if state.get("stage") != "entry_agent" or state.get("status") != "Success":
+                return False
             
-            print(f"     💬 自由文本检查: event_type={event_type}, stage={stage}, status={status}")
+            event_type = state.get("event_type")
+            logger.debug("event_type=<%s> | 自由文本检查", event_type)
             
             # 自由文本直接进入路由决策，跳过用户交互
-            return (stage == "entry_agent" and 
-                    status == "Success" and 
-                    event_type == "chat")
+            return event_type == "chat"
         
         # 条件分支：点击事件 -> 服务选择流程
         builder.add_state_aware_edge(entry_node, service_selector_node, is_click_event)
@@ -465,7 +617,7 @@ class MultiAgentCustomerService:
         # 用户交互边：service_selector -> priority_confirmer (需要用户选择服务类型)
         def has_service_selection(state_manager: StateManager) -> bool:
             """检查是否有用户的服务类型选择"""
-            user_input_data = state_manager.get_state("service_selector_user_input")
+            user_input_data = state_manager.global_state.get("service_selector_user_input")
             if user_input_data:
                 user_selection = user_input_data.get("input")
                 original_output = user_input_data.get("original_output", {})
@@ -478,12 +630,14 @@ class MultiAgentCustomerService:
                     if 0 <= choice_index < len(options):
                         actual_service_type = options[choice_index]
                 
-                print(f"     ✅ 发现服务类型选择: {user_selection} -> {actual_service_type}")
+                logger.debug(
+                    "user_selection=<%s>, service_type=<%s> | 发现服务类型选择", user_selection, actual_service_type
+                )
                 
                 # 将实际的服务类型名称传递给priority_confirmer工具
                 state_manager.global_state["selected_service_type"] = actual_service_type
                 return True
-            print(f"     ❌ 未发现服务类型选择")
+            logger.debug("未发现服务类型选择")
             return False
         
         builder.add_state_aware_edge(
@@ -494,119 +648,39 @@ class MultiAgentCustomerService:
         )
         
         # 点击流程中的人工干预决策：priority_confirmer -> transfer_agent 或 answer_agent
-        def click_needs_human_intervention(state_manager: StateManager) -> bool:
-            """点击流程中检查是否需要人工干预"""
-            user_input_data = state_manager.get_state("priority_confirmer_user_input")
-            if not user_input_data:
-                return False
-                
-            user_confirmation = user_input_data.get("input")
-            # 使用转换后的服务类型名称
-            service_type = state_manager.global_state.get("selected_service_type", "")
-            
-            # 解析用户选择的优先级
-            if "高优先级" in user_confirmation or "确认" in user_confirmation:
-                state_manager.global_state["user_priority_level"] = "high"
-            elif "中优先级" in user_confirmation:
-                state_manager.global_state["user_priority_level"] = "medium"
-            elif "低优先级" in user_confirmation:
-                state_manager.global_state["user_priority_level"] = "low"
-            
-            user_priority_level = state_manager.global_state.get("user_priority_level")
-            
-            # 高优先级服务类型
-            high_priority_services = ["退款退货", "投诉建议"]
-            
-            # 判断是否需要人工干预
-            needs_human = False
-            
-            # 1. 明确的高优先级选择
-            if user_priority_level == "high" or "高优先级" in user_confirmation or "确认" in user_confirmation:
-                needs_human = True
-                
-            # 2. 高优先级服务类型
-            elif service_type in high_priority_services:
-                needs_human = True
-            
-            print(f"     🤔 点击流程人工干预检查: service_type={service_type}, priority_level={user_priority_level}")
-            print(f"        决策结果: needs_human={needs_human}")
-            
-            return needs_human
-        
-        def click_needs_auto_processing(state_manager: StateManager) -> bool:
-            """点击流程中检查是否需要自动处理"""
-            user_input_data = state_manager.get_state("priority_confirmer_user_input")
-            if not user_input_data:
-                return False
-                
-            user_confirmation = user_input_data.get("input")
-            # 使用转换后的服务类型名称
-            service_type = state_manager.global_state.get("selected_service_type", "")
-            
-            user_priority_level = state_manager.global_state.get("user_priority_level")
-            
-            # 高优先级服务类型
-            high_priority_services = ["退款退货", "投诉建议"]
-            
-            # 判断是否自动处理（与人工干预相反的逻辑）
-            needs_auto = True
+        def click_route(state_manager: StateManager) -> Optional[str]:
+            """点击流程路由：需要人工干预时转人工，否则直接回答"""
+            decision = _click_route_decision(state_manager)
+            if decision is None:
+                return None
             
-            # 1. 明确的高优先级选择 -> 不自动处理
-            if user_priority_level == "high" or "高优先级" in user_confirmation or "确认" in user_confirmation:
-                needs_auto = False
-                
-            # 2. 高优先级服务类型 -> 不自动处理
-            elif service_type in high_priority_services:
-                needs_auto = False
+            needs_human, service_type, user_priority_level = decision
             
-            print(f"     🤖 点击流程自动处理检查: service_type={service_type}, priority_level={user_priority_level}")
-            print(f"        决策结果: needs_auto={needs_auto}")
+            logger.debug(
+                "service_type=<%s>, priority_level=<%s>, needs_human=<%s> | 点击流程人工干预检查",
+                service_type, user_priority_level, needs_human
+            )
             
-            return needs_auto
+            return "transfer_agent" if needs_human else "answer_agent"
         
-        # 点击流程的条件边（需要用户输入后才能判断）
-        builder.add_state_aware_edge(
+        # 点击流程的互斥分支（需要用户输入后才能判断）
+        builder.add_state_aware_branch(
             priority_confirmer_node,
-            transfer_node,
-            click_needs_human_intervention,
+            [transfer_node, answer_node],
+            click_route,
             requires_user_input=True  # 需要用户输入
         )
         
-        builder.add_state_aware_edge(
-            priority_confirmer_node,
-            answer_node,
-            click_needs_auto_processing,
-            requires_user_input=True  # 需要用户输入
+        # 聊天流程的路由决策：根据route_agent输出的requires_human决定转人工或意图分析
+        # 条件只取决于三个状态字段的取值组合，直接用路由表查找
+        builder.add_routing_table(
+            route_node,
+            ("stage", "status", "requires_human"),
+            {
+                ("route_agent", "Success", True): transfer_node,
+                ("route_agent", "Success", False): intent_node,
+            }
         )
-        
-        # 聊天流程的路由决策边（保持原有逻辑）
-        def needs_human_intervention(state_manager: StateManager) -> bool:
-            """聊天流程中检查是否需要人工干预"""
-            requires_human = state_manager.get_state("requires_human")
-            stage = state_manager.get_state("stage")
-            status = state_manager.get_state("status")
-            
-            print(f"     🤔 聊天流程人工干预检查: requires_human={requires_human}, stage={stage}, status={status}")
-            
-            return (stage == "route_agent" and 
-                    status == "Success" and 
-                    requires_human == True)
-        
-        def needs_auto_processing(state_manager: StateManager) -> bool:
-            """聊天流程中检查是否需要自动处理"""
-            requires_human = state_manager.get_state("requires_human")
-            stage = state_manager.get_state("stage")
-            status = state_manager.get_state("status")
-            
-            print(f"     🤖 聊天流程自动处理检查: requires_human={requires_human}, stage={stage}, status={status}")
-            
-            return (stage == "route_agent" and 
-                    status == "Success" and 
-                    requires_human == False)
-        
-        # 聊天流程的条件边
-        builder.add_state_aware_edge(route_node, transfer_node, needs_human_intervention)
-        builder.add_state_aware_edge(route_node, intent_node, needs_auto_processing)
         builder.add_edge(intent_node, answer_node)
         
         # 设置入口点
@@ -615,27 +689,71 @@ class MultiAgentCustomerService:
         return builder.build()
     
     def execute(self, user_input: str):
-        """执行多Agent工作流"""
-        print("\n🚀 多Agent客户服务工作流开始执行")
-        print("="*60)
-        print(f"📥 用户输入: {user_input}")
+        """执行多Agent工作流 - execute_async的同步入口
+        
+        与Graph.__call__一样在独立线程的事件循环中运行，调用方已处于事件循环中时也可以使用。
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.execute_async(user_input)).result()
+    
+    async def execute_async(self, user_input: str):
+        """异步执行多Agent工作流 - 可在同一个事件循环中与其他请求并发等待模型调用"""
+        # 并发执行时多个请求的输出会交错，通过logger输出以保证每条记录完整
+        logger.info("多Agent客户服务工作流开始执行")
+        # 用户输入可能包含个人信息，只在DEBUG级别记录
+        logger.debug("user_input=<%s> | 收到用户输入", user_input)
+        
+        # 清空上一次请求遗留的状态，图结构保持不变
+        self.graph.reset()
         
         try:
-            # 执行图
-            result = self.graph(user_input)
-            
-            return result
+            # 同一批就绪的节点由Graph并发执行，这里直接等待整个图完成
+            return await self.graph.invoke_async(user_input)
             
         except Exception as e:
-            print(f"❌ 执行失败: {str(e)}")
+            logger.error("error=<%s> | 执行失败", e)
             raise
     
+    @classmethod
+    async def run_batch_async(cls, inputs: List[str], max_concurrency: int = 8) -> List[Any]:
+        """并发执行一批相互独立的请求
+        
+        图带有单次执行的状态，不能被并发请求同时使用，因此每个请求使用独立的实例和图
+        （各自的StateManager）。同时执行的请求数由信号量限制。
+        
+        Args:
+            inputs: 用户输入列表
+            max_concurrency: 最大并发请求数
+            
+        Returns:
+            与inputs顺序一致的列表，每项为(客户服务实例, 执行结果)；执行失败的请求对应位置为异常对象
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run_one(user_input: str):
+            async with semaphore:
+                customer_service = cls()
+                return customer_service, await customer_service.execute_async(user_input)
+        
+        return await asyncio.gather(*(run_one(user_input) for user_input in inputs), return_exceptions=True)
+    
+    @classmethod
+    def run_batch(cls, inputs: List[str], max_concurrency: int = 8) -> List[Any]:
+        """并发执行一批相互独立的请求 - run_batch_async的同步入口，返回值与其相同"""
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, cls.run_batch_async(inputs, max_concurrency)).result()
+    
     def execute_interactive(self, user_input: str):
         """交互式执行多Agent工作流 - 在点击事件中等待用户终端输入"""
+        from stateful_graph import UserInteractionRequiredException
+        
         print("\n🚀 多Agent客户服务工作流开始执行（交互模式）")
         print("="*60)
         print(f"📥 用户输入: {user_input}")
         
+        # 清空上一次请求遗留的状态，图结构保持不变
+        self.graph.reset()
+        
         try:
             # 执行图，捕获用户交互异常
             result = self.graph(user_input)
@@ -643,13 +761,36 @@ class MultiAgentCustomerService:
             
         except UserInteractionRequiredException as e:
             # 处理用户交互请求
-            return self._handle_user_interaction(user_input, e.interaction_request)
+            return self._handle_user_interaction(e.interaction_request)
         except Exception as e:
             print(f"❌ 执行失败: {str(e)}")
             raise
     
-    def _handle_user_interaction(self, original_input: str, interaction_request: Dict[str, Any]):
-        """处理用户交互请求 - 等待终端输入并继续执行"""
+    def _handle_user_interaction(self, interaction_request: Dict[str, Any]):
+        """处理用户交互请求 - 等待终端输入并从暂停处继续执行，直到不再需要用户输入"""
+        from stateful_graph import UserInteractionRequiredException
+        
+        while True:
+            user_choice = self._prompt_user(interaction_request)
+            if user_choice is None:
+                return None
+            
+            # 提供用户输入
+            self.graph.provide_user_input(user_choice)
+            
+            # 继续执行，已完成的节点不会重新执行；可能还有更多用户交互
+            try:
+                return self.graph.resume()
+                
+            except UserInteractionRequiredException as e:
+                # 处理下一个用户交互
+                interaction_request = e.interaction_request
+            except Exception as e:
+                print(f"❌ 继续执行失败: {str(e)}")
+                raise
+    
+    def _prompt_user(self, interaction_request: Dict[str, Any]) -> Optional[str]:
+        """在终端展示交互请求并读取用户选择，用户取消时返回None"""
         node_id = interaction_request.get("node_id")
         original_output = interaction_request.get("original_output", {})
         
@@ -690,9 +831,7 @@ class MultiAgentCustomerService:
                         print(f"❌ 无效选择，请输入 1-{len(options)} 之间的数字")
                         continue
                 
-                # 提供用户输入
-                self.graph.provide_user_input(user_choice)
-                break
+                return user_choice
                 
             except KeyboardInterrupt:
                 print("\n\n❌ 用户取消操作")
@@ -700,21 +839,14 @@ class MultiAgentCustomerService:
             except Exception as e:
                 print(f"❌ 输入处理错误: {e}")
                 continue
-        
-        # 继续执行，可能还有更多用户交互
-        try:
-            result = self.graph(original_input)
-            return result
-            
-        except UserInteractionRequiredException as e:
-            # 递归处理下一个用户交互
-            return self._handle_user_interaction(original_input, e.interaction_request)
-        except Exception as e:
-            print(f"❌ 继续执行失败: {str(e)}")
-            raise
     
-    def print_execution_summary(self, result):
-        """打印执行摘要"""
+    def print_execution_summary(self, result, show_state: bool = True):
+        """打印执行摘要
+        
+        Args:
+            result: 图执行结果
+            show_state: 是否输出完整的最终状态（状态较大时格式化开销明显，可关闭）
+        """
         print(f"\n✅ 工作流执行完成:")
         print(f"  状态: {result.status}")
         print(f"  完成节点数: {result.completed_nodes}/{result.total_nodes}")
@@ -727,9 +859,21 @@ class MultiAgentCustomerService:
             print(f"  {i}. {node.node_id}")
         
         # 显示最终状态
+        if not show_state:
+            return
         final_state = self.graph.state_manager.get_state()
         print(f"\n📊 最终状态:")
-        print(json.dumps(final_state, ensure_ascii=False, indent=2))
+        _print_pretty(final_state)
+
+
+@lru_cache(maxsize=1)
+def _get_shared_graph():
+    """构建并缓存进程内共享的多Agent图 - 节点、边和条件函数只创建一次
+    
+    只供MultiAgentCustomerService(reuse_graph=True)使用，调用方负责保证同一时间只有一个请求使用。
+    目前由interactive_demo使用；run_batch等并发路径的每个请求仍各自构建图
+    """
+    return MultiAgentCustomerService._create_graph()
 
 
 # ==================== 主程序和测试 ====================
@@ -744,8 +888,8 @@ def interactive_demo():
     print("  - 智能路由：根据用户选择决定人工干预或自动处理")
     print("="*60)
     
-    # 创建多Agent系统
-    customer_service = MultiAgentCustomerService()
+    # 创建多Agent系统 - 演示循环逐个处理请求，同一时间只有一个请求使用图，可以复用进程内共享的图
+    customer_service = MultiAgentCustomerService(reuse_graph=True)
     
     while True:
         try:
@@ -795,6 +939,12 @@ def interactive_demo():
 
 def main():
     """主程序"""
+    # 只在命令行入口为本模块的logger配置输出，不修改根logger，作为库导入时由调用方决定
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    
     print("🎯 多Agent客户服务系统演示 - 基于StatefulGraph的继承模式版本")
     print("="*60)
     print("💡 设计特点：")
@@ -835,29 +985,24 @@ def run_auto_tests():
         "请问你们有什么旅游活动推荐吗？",  # 应该自动处理
     ]
     
-    for i, test_input in enumerate(test_cases, 1):
+    # 各测试用例相互独立，且主要耗时在模型调用上，在同一个事件循环中并发执行
+    outcomes = MultiAgentCustomerService.run_batch(test_cases)
+    
+    # 按用例顺序输出执行摘要
+    for i, (test_input, outcome) in enumerate(zip(test_cases, outcomes), 1):
         print(f"\n{'='*60}")
         print(f"🧪 测试用例 {i}: {test_input}")
         print("="*60)
         
-        try:
-            # 创建多Agent系统
-            customer_service = MultiAgentCustomerService()
-            
-            # 执行工作流
-            result = customer_service.execute(test_input)
-            
-            # 打印执行摘要
-            customer_service.print_execution_summary(result)
-                
-        except Exception as e:
-            print(f"❌ 测试用例 {i} 执行失败: {str(e)}")
+        if isinstance(outcome, Exception):
+            print(f"❌ 测试用例 {i} 执行失败: {str(outcome)}")
             import traceback
-            traceback.print_exc()
+            traceback.print_exception(outcome)
+            continue
         
-        if i < len(test_cases):
-            print(f"\n⏳ 等待下一个测试用例...")
-            time.sleep(1)
+        # 打印执行摘要
+        customer_service, result = outcome
+        customer_service.print_execution_summary(result)
     
     print(f"\n🎉 所有测试用例执行完成！")
     print("\n💡 系统特性验证:")
@@ -6,8 +6,19 @@ Create DynamoDB table for Strands session storage
 import argparse
 import boto3
 import time
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Shared client config: adaptive retries back off on throttling instead of
+# retrying immediately, and TCP keepalive avoids stale idle connections
+DYNAMODB_CONFIG = Config(
+    retries={
+        'max_attempts': 10,
+        'mode': 'adaptive'
+    },
+    tcp_keepalive=True
+)
+
 def create_session_table(table_name, region=None):
     """Create DynamoDB table for session storage"""
     
@@ -16,7 +27,7 @@ def create_session_table(table_name, region=None):
     
     try:
         # Initialize DynamoDB client
-        dynamodb = boto3.client('dynamodb', region_name=region)
+        dynamodb = boto3.client('dynamodb', region_name=region, config=DYNAMODB_CONFIG)
         
         # Check if table already exists
         try:
@@ -76,44 +87,40 @@ def create_session_table(table_name, region=None):
         # Wait for table to be created
         print("⏳ Waiting for table to become active...")
         waiter = dynamodb.get_waiter('table_exists')
+        # On-demand tables usually become active within a few seconds, so poll
+        # every second instead of every 5 seconds (same 100 second overall budget)
         waiter.wait(
             TableName=table_name,
             WaiterConfig={
-                'Delay': 5,
-                'MaxAttempts': 20
+                'Delay': 1,
+                'MaxAttempts': 100
             }
         )
         
-        # Verify table status
-        response = dynamodb.describe_table(TableName=table_name)
-        table_status = response['Table']['TableStatus']
+        # The table_exists waiter only succeeds once TableStatus is ACTIVE,
+        # so no extra describe_table round trip is needed here
+        print(f"✅ Table '{table_name}' created successfully!")
+        print(f"📊 Status: ACTIVE")
+        print(f"🔑 Partition Key: session_id (String)")
+        print(f"🔑 Sort Key: entity_type (String)")
+        print(f"💰 Billing Mode: Pay-per-request")
         
-        if table_status == 'ACTIVE':
-            print(f"✅ Table '{table_name}' created successfully!")
-            print(f"📊 Status: {table_status}")
-            print(f"🔑 Partition Key: session_id (String)")
-            print(f"🔑 Sort Key: entity_type (String)")
-            print(f"💰 Billing Mode: Pay-per-request")
-            
-            # Enable TTL
-            try:
-                print("⏳ Enabling TTL on 'ttl' attribute...")
-                dynamodb.update_time_to_live(
-                    TableName=table_name,
-                    TimeToLiveSpecification={
-                        'AttributeName': 'ttl',
-                        'Enabled': True
-                    }
-                )
-                print("✅ TTL enabled successfully")
-            except Exception as ttl_error:
-                print(f"⚠️ TTL setup failed: {ttl_error}")
-                print("ℹ️ You can enable TTL manually in AWS Console")
-            
-            return True
-        else:
-            print(f"⚠️ Table created but status is: {table_status}")
-            return False
+        # Enable TTL (CreateTable does not accept a TTL specification)
+        try:
+            print("⏳ Enabling TTL on 'ttl' attribute...")
+            dynamodb.update_time_to_live(
+                TableName=table_name,
+                TimeToLiveSpecification={
+                    'AttributeName': 'ttl',
+                    'Enabled': True
+                }
+            )
+            print("✅ TTL enabled successfully")
+        except Exception as ttl_error:
+            print(f"⚠️ TTL setup failed: {ttl_error}")
+            print("ℹ️ You can enable TTL manually in AWS Console")
+        
+        return True
             
     except ClientError as e:
         error_code = e.response['Error']['Code']
@@ -140,7 +147,7 @@ def test_table_access(table_name, region=None):
     print(f"\n🧪 Testing table access...")
     
     try:
-        dynamodb = boto3.resource('dynamodb', region_name=region)
+        dynamodb = boto3.resource('dynamodb', region_name=region, config=DYNAMODB_CONFIG)
         table = dynamodb.Table(table_name)
         
         # Test put item
@@ -11,9 +11,158 @@
 
 import re
 import json
-from typing import Dict, Any, List, Optional, Union, Callable
+from typing import Dict, Any, List, Optional, Tuple, Union, Callable
 from datetime import datetime
-import random
+import itertools
+from types import MappingProxyType
+
+from _keyword_scanner import compile_any_keyword, compile_keyword_scanner
+
+
+# 预编译的正则表达式 - 提取器在每次工具调用时都会执行，避免重复查找re模块的编译缓存
+# 基本数学表达式；其字符集覆盖了"简单运算"和"单个数字"两种模式，后两者无需单独匹配
+_MATH_RE = re.compile(r'[\d+\-*/\(\)\s\.]+')
+_CHINESE_LOCATION_RE = re.compile(r'[\u4e00-\u9fff]+[市省区县]')
+# 多个候选模式按优先级排列，依次搜索，返回第一个命中模式的第一个匹配
+_TIME_PATTERNS = (
+    re.compile(r'\d{4}-\d{2}-\d{2}'),  # YYYY-MM-DD
+    re.compile(r'\d{2}:\d{2}'),  # HH:MM
+    re.compile(r'\d{4}年\d{1,2}月\d{1,2}日'),  # 中文日期
+    re.compile(r'今天|明天|昨天'),  # 相对时间
+)
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_FILE_PATTERNS = (
+    re.compile(r'[^\s]+\.[a-zA-Z0-9]+'),  # 带扩展名的文件
+    re.compile(r'/[^\s]+'),  # Unix路径
+    re.compile(r'[A-Z]:\\[^\s]+'),  # Windows路径
+)
+_URL_RE = re.compile(r'https?://[^\s]+')
+_INT_RE = re.compile(r'\d+')
+_FLOAT_RE = re.compile(r'\d+\.?\d*')
+
+# 工具规范分析结果缓存的最大条目数（超过后整体清空重建）
+_SCHEMA_CACHE_SIZE = 256
+# 字段语义类别缓存的最大条目数（超过后整体清空重建）
+_CATEGORY_CACHE_SIZE = 1024
+
+
+def _search_by_priority(patterns: Tuple[re.Pattern, ...], text: str) -> Optional[str]:
+    """
+    按优先级依次搜索，返回第一个命中的模式的第一个匹配
+    
+    不把模式合并为一个交替表达式：单次扫描时低优先级的匹配会先消耗掉文本，
+    导致与其重叠的高优先级匹配丢失（如"12:3456-78-90"中的日期）。
+    search在第一个匹配处即停止，不需要像findall那样收集全部匹配。
+    
+    Args:
+        patterns: 按优先级排列的预编译正则
+        text: 待匹配文本
+        
+    Returns:
+        匹配到的文本或None
+    """
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match is not None:
+            return match.group()
+    return None
+
+
+# ==================== 类型转换与默认值 ====================
+
+# 布尔字段中表示"真"的字符串
+_TRUE_STRINGS = frozenset({'true', '是', 'yes', '1'})
+
+
+def _to_string(value: Any) -> str:
+    return str(value)
+
+
+def _to_integer(value: Any) -> int:
+    if isinstance(value, str):
+        # 纯数字字符串直接转换（isdecimal与正则中的\d字符集一致），否则提取第一个数字
+        if value.isdecimal():
+            return int(value)
+        match = _INT_RE.search(value)
+        return int(match.group()) if match else 0
+    return int(value)
+
+
+def _to_number(value: Any) -> float:
+    if isinstance(value, str):
+        match = _FLOAT_RE.search(value)
+        return float(match.group()) if match else 0.0
+    return float(value)
+
+
+def _to_boolean(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.lower() in _TRUE_STRINGS
+    return bool(value)
+
+
+def _to_array(value: Any) -> list:
+    if isinstance(value, str):
+        # 尝试分割字符串
+        return [item.strip() for item in value.split(',')]
+    return [value] if not isinstance(value, list) else value
+
+
+# JSON Schema类型 -> 转换函数，未列出的类型保持原值
+_TYPE_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "string": _to_string,
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+    "array": _to_array,
+}
+
+# 默认数值的来源：进程内所有生成器共享同一个计数器，无需经过全局随机数生成器
+# 给定调用顺序时默认值是确定的：整数循环取1~100，浮点数循环取1.5~99.5（保留小数部分）
+_default_counter = itertools.count()
+
+
+def _next_default_int() -> int:
+    return next(_default_counter) % 100 + 1
+
+
+def _next_default_number() -> float:
+    return next(_default_counter) % 99 + 1.5
+
+
+# JSON Schema类型 -> 默认值生成函数 (field_name, user_input)，未列出的类型返回None
+_DEFAULT_VALUE_FACTORIES: Dict[str, Callable[[str, str], Any]] = {
+    "string": lambda field_name, user_input: user_input if user_input else f"auto_{field_name}",
+    "integer": lambda field_name, user_input: _next_default_int(),
+    "number": lambda field_name, user_input: _next_default_number(),
+    "boolean": lambda field_name, user_input: True,
+    "array": lambda field_name, user_input: [f"item_{i}" for i in range(1, 3)],
+    "object": lambda field_name, user_input: {"key": "value"},
+}
+
+
+# ==================== 地名数据库 ====================
+
+# 常见地名数据库（可扩展），在所有生成器实例间共享
+_LOCATION_DATABASE = MappingProxyType({
+    'chinese_cities': ('北京', '上海', '广州', '深圳', '杭州', '南京', '武汉', '成都', '西安', '重庆'),
+    'english_cities': ('Beijing', 'Shanghai', 'Guangzhou', 'Shenzhen', 'New York', 'London', 'Tokyo'),
+    'countries': ('中国', '美国', '英国', '日本', '德国', 'China', 'USA', 'UK', 'Japan', 'Germany'),
+})
+
+
+def _rank_locations(database) -> Dict[str, int]:
+    """按地名在数据库中出现的顺序生成优先级（数值越小越优先）"""
+    rank: Dict[str, int] = {}
+    for locations in database.values():
+        for location in locations:
+            rank.setdefault(location, len(rank))
+    return rank
+
+
+# 所有地名编译为单次扫描的多模式匹配器
+_LOCATION_RANK = _rank_locations(_LOCATION_DATABASE)
+_LOCATION_SCANNER = compile_keyword_scanner(_LOCATION_RANK)
 
 
 class SmartInputGenerator:
@@ -23,6 +172,8 @@ class SmartInputGenerator:
     基于工具的JSON Schema规范和用户输入，自动生成合适的工具参数
     """
     
+    location_database = _LOCATION_DATABASE
+    
     def __init__(self):
         """初始化智能输入生成器"""
         # 语义映射规则 - 基于字段名称和描述的关键词匹配
@@ -76,12 +227,17 @@ class SmartInputGenerator:
             }
         }
         
-        # 常见地名数据库（可扩展）
-        self.location_database = {
-            'chinese_cities': ['北京', '上海', '广州', '深圳', '杭州', '南京', '武汉', '成都', '西安', '重庆'],
-            'english_cities': ['Beijing', 'Shanghai', 'Guangzhou', 'Shenzhen', 'New York', 'London', 'Tokyo'],
-            'countries': ['中国', '美国', '英国', '日本', '德国', 'China', 'USA', 'UK', 'Japan', 'Germany']
+        # 每个语义类别的关键词编译为一个多选正则，一次search即可判断是否包含任意关键词
+        # （与逐个 `keyword in search_text` 的子串匹配语义一致）
+        self._keyword_patterns = {
+            category: compile_any_keyword(rule['keywords'])
+            for category, rule in self.semantic_rules.items()
         }
+        
+        # 工具规范分析结果缓存：id(tool_spec) -> (tool_spec, 字段元组)
+        self._schema_cache: Dict[int, tuple] = {}
+        # 字段语义类别缓存："字段名称 字段描述"(小写) -> 命中的语义类别元组
+        self._category_cache: Dict[str, tuple] = {}
     
     def generate_input(self, tool_info: Dict[str, Any], user_input: str) -> Dict[str, Any]:
         """
@@ -94,19 +250,18 @@ class SmartInputGenerator:
         Returns:
             生成的工具参数字典
         """
-        tool_spec = tool_info.get("spec", {})
-        properties = tool_spec.get("properties", {})
-        required_fields = tool_spec.get("required", [])
-        
         generated_params = {}
+        # 提取器只依赖用户输入，同一次调用中每个语义类别最多扫描一次用户输入
+        extracted: Dict[str, Any] = {}
         
         # 遍历所有字段，智能生成参数
-        for field_name, field_schema in properties.items():
+        for field_name, field_schema, is_required in self._compile_schema(tool_info.get("spec", {})):
             value = self._generate_field_value(
                 field_name=field_name,
                 field_schema=field_schema,
                 user_input=user_input,
-                is_required=field_name in required_fields
+                is_required=is_required,
+                extracted=extracted
             )
             
             if value is not None:
@@ -114,8 +269,37 @@ class SmartInputGenerator:
         
         return generated_params
     
+    def _compile_schema(self, tool_spec: Dict[str, Any]) -> tuple:
+        """
+        分析工具规范，返回 (字段名称, 字段schema, 是否必需) 元组
+        
+        工具规范在对话过程中不会变化，同一个工具通常会被多次调用，
+        因此按规范对象缓存分析结果。缓存条目持有规范对象本身，避免id被复用导致误命中。
+        
+        Args:
+            tool_spec: 工具的JSON Schema规范
+            
+        Returns:
+            字段信息元组
+        """
+        cached = self._schema_cache.get(id(tool_spec))
+        if cached is not None and cached[0] is tool_spec:
+            return cached[1]
+        
+        required_fields = frozenset(tool_spec.get("required", ()))
+        fields = tuple(
+            (field_name, field_schema, field_name in required_fields)
+            for field_name, field_schema in tool_spec.get("properties", {}).items()
+        )
+        
+        if len(self._schema_cache) >= _SCHEMA_CACHE_SIZE:
+            self._schema_cache.clear()
+        self._schema_cache[id(tool_spec)] = (tool_spec, fields)
+        return fields
+    
     def _generate_field_value(self, field_name: str, field_schema: Dict[str, Any], 
-                            user_input: str, is_required: bool = False) -> Any:
+                            user_input: str, is_required: bool = False,
+                            extracted: Optional[Dict[str, Any]] = None) -> Any:
         """
         为单个字段生成值
         
@@ -124,6 +308,7 @@ class SmartInputGenerator:
             field_schema: 字段的JSON Schema
             user_input: 用户输入
             is_required: 是否为必需字段
+            extracted: 本次调用中已提取的结果（语义类别 -> 值）
             
         Returns:
             生成的字段值
@@ -132,14 +317,15 @@ class SmartInputGenerator:
         field_description = field_schema.get("description", "")
         
         # 1. 尝试基于语义规则匹配
-        semantic_value = self._extract_by_semantics(field_name, field_description, user_input)
+        semantic_value = self._extract_by_semantics(field_name, field_description, user_input, extracted)
         if semantic_value is not None:
             return self._convert_to_type(semantic_value, field_type, field_schema)
         
         # 2. 基于字段类型生成默认值
         return self._generate_default_value(field_type, field_schema, field_name, user_input)
     
-    def _extract_by_semantics(self, field_name: str, field_description: str, user_input: str) -> Any:
+    def _extract_by_semantics(self, field_name: str, field_description: str, user_input: str,
+                              extracted: Optional[Dict[str, Any]] = None) -> Any:
         """
         基于语义规则提取值
         
@@ -147,53 +333,79 @@ class SmartInputGenerator:
             field_name: 字段名称
             field_description: 字段描述
             user_input: 用户输入
+            extracted: 本次调用中已提取的结果（语义类别 -> 值），提取结果会写回其中
             
         Returns:
             提取的值或None
         """
-        # 组合字段名称和描述进行匹配
-        search_text = f"{field_name} {field_description}".lower()
+        if extracted is None:
+            extracted = {}
+        
+        # 按规则顺序尝试字段命中的语义类别
+        for category in self._match_categories(field_name, field_description):
+            if category not in extracted:
+                extracted[category] = self._run_extractors(self.semantic_rules[category]['extractors'], user_input)
+            result = extracted[category]
+            if result is not None:
+                return result
+        
+        return None
+    
+    def _match_categories(self, field_name: str, field_description: str) -> tuple:
+        """
+        返回字段名称和描述命中关键词的语义类别（按规则顺序）
         
-        # 遍历语义规则
-        for category, rule in self.semantic_rules.items():
-            # 检查关键词匹配
-            if any(keyword in search_text for keyword in rule['keywords']):
-                # 尝试所有提取器
-                for extractor in rule['extractors']:
-                    result = extractor(user_input)
-                    if result is not None:
-                        return result
+        字段名称和描述来自静态的工具规范，同一字段在每次调用时的匹配结果都相同，
+        因此缓存匹配结果，后续调用只需一次字典查找。
         
+        Args:
+            field_name: 字段名称
+            field_description: 字段描述
+            
+        Returns:
+            语义类别元组
+        """
+        # 组合字段名称和描述进行匹配
+        search_text = f"{field_name} {field_description}".lower()
+        categories = self._category_cache.get(search_text)
+        if categories is None:
+            categories = tuple(
+                category for category, pattern in self._keyword_patterns.items()
+                if pattern.search(search_text)
+            )
+            if len(self._category_cache) >= _CATEGORY_CACHE_SIZE:
+                self._category_cache.clear()
+            self._category_cache[search_text] = categories
+        return categories
+    
+    @staticmethod
+    def _run_extractors(extractors: List[Callable[[str], Any]], user_input: str) -> Any:
+        """依次尝试提取器，返回第一个非None的结果"""
+        for extractor in extractors:
+            result = extractor(user_input)
+            if result is not None:
+                return result
         return None
     
     def _extract_math_expression(self, text: str) -> Optional[str]:
         """提取数学表达式"""
         # 匹配数学表达式模式
-        patterns = [
-            r'[\d+\-*/\(\)\s\.]+',  # 基本数学表达式
-            r'\d+\s*[+\-*/]\s*\d+',  # 简单运算
-            r'\d+(\.\d+)?',  # 单个数字
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                # 返回最长的匹配
-                return max(matches, key=len).strip()
+        matches = _MATH_RE.findall(text)
+        if matches:
+            # 返回最长的匹配
+            return max(matches, key=len).strip()
         
         return None
     
     def _extract_location(self, text: str) -> Optional[str]:
         """提取地理位置"""
-        # 检查所有地名数据库
-        for category, locations in self.location_database.items():
-            for location in locations:
-                if location in text:
-                    return location
+        # 一次扫描找出文本中出现的所有已知地名，按数据库顺序返回第一个
+        found = _LOCATION_SCANNER.findall(text)
+        if found:
+            return min(found, key=_LOCATION_RANK.__getitem__)
         
         # 尝试提取可能的地名（中文地名通常以"市"、"省"、"区"结尾）
-        chinese_location_pattern = r'[\u4e00-\u9fff]+[市省区县]'
-        matches = re.findall(chinese_location_pattern, text)
+        matches = _CHINESE_LOCATION_RE.findall(text)
         if matches:
             return matches[0]
         
@@ -202,17 +414,9 @@ class SmartInputGenerator:
     def _extract_time(self, text: str) -> Optional[str]:
         """提取时间信息"""
         # 时间模式匹配
-        time_patterns = [
-            r'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-            r'\d{2}:\d{2}',  # HH:MM
-            r'\d{4}年\d{1,2}月\d{1,2}日',  # 中文日期
-            r'今天|明天|昨天',  # 相对时间
-        ]
-        
-        for pattern in time_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                return matches[0]
+        match = _search_by_priority(_TIME_PATTERNS, text)
+        if match is not None:
+            return match
         
         # 如果没有找到具体时间，返回当前时间
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -228,8 +432,7 @@ class SmartInputGenerator:
     def _extract_email_info(self, text: str) -> Optional[str]:
         """提取邮件信息"""
         # 邮件地址模式
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        matches = re.findall(email_pattern, text)
+        matches = _EMAIL_RE.findall(text)
         if matches:
             return matches[0]
         
@@ -239,7 +442,7 @@ class SmartInputGenerator:
     def _extract_numbers(self, text: str) -> Optional[Union[int, float]]:
         """提取数字"""
         # 提取所有数字
-        numbers = re.findall(r'\d+\.?\d*', text)
+        numbers = _FLOAT_RE.findall(text)
         if numbers:
             # 返回第一个数字，尝试转换为适当类型
             num_str = numbers[0]
@@ -253,23 +456,11 @@ class SmartInputGenerator:
     def _extract_file_info(self, text: str) -> Optional[str]:
         """提取文件信息"""
         # 文件路径或文件名模式
-        file_patterns = [
-            r'[^\s]+\.[a-zA-Z0-9]+',  # 带扩展名的文件
-            r'/[^\s]+',  # Unix路径
-            r'[A-Z]:\\[^\s]+',  # Windows路径
-        ]
-        
-        for pattern in file_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                return matches[0]
-        
-        return None
+        return _search_by_priority(_FILE_PATTERNS, text)
     
     def _extract_url(self, text: str) -> Optional[str]:
         """提取URL"""
-        url_pattern = r'https?://[^\s]+'
-        matches = re.findall(url_pattern, text)
+        matches = _URL_RE.findall(text)
         if matches:
             return matches[0]
         
@@ -287,31 +478,13 @@ class SmartInputGenerator:
         Returns:
             转换后的值
         """
+        # 联合类型（如 ["string", "null"]）不可哈希，同样保持原值
+        converter = _TYPE_CONVERTERS.get(target_type) if isinstance(target_type, str) else None
+        if converter is None:
+            return value
+        
         try:
-            if target_type == "string":
-                return str(value)
-            elif target_type == "integer":
-                if isinstance(value, str):
-                    # 从字符串中提取数字
-                    numbers = re.findall(r'\d+', value)
-                    return int(numbers[0]) if numbers else 0
-                return int(value)
-            elif target_type == "number":
-                if isinstance(value, str):
-                    numbers = re.findall(r'\d+\.?\d*', value)
-                    return float(numbers[0]) if numbers else 0.0
-                return float(value)
-            elif target_type == "boolean":
-                if isinstance(value, str):
-                    return value.lower() in ['true', '是', 'yes', '1']
-                return bool(value)
-            elif target_type == "array":
-                if isinstance(value, str):
-                    # 尝试分割字符串
-                    return [item.strip() for item in value.split(',')]
-                return [value] if not isinstance(value, list) else value
-            else:
-                return value
+            return converter(value)
         except (ValueError, TypeError):
             return value
     
@@ -338,20 +511,31 @@ class SmartInputGenerator:
             return field_schema["enum"][0]
         
         # 基于类型生成默认值
-        if field_type == "string":
-            return user_input if user_input else f"auto_{field_name}"
-        elif field_type == "integer":
-            return random.randint(1, 100)
-        elif field_type == "number":
-            return round(random.uniform(1.0, 100.0), 2)
-        elif field_type == "boolean":
-            return True
-        elif field_type == "array":
-            return [f"item_{i}" for i in range(1, 3)]
-        elif field_type == "object":
-            return {"key": "value"}
-        else:
-            return None
+        factory = _DEFAULT_VALUE_FACTORIES.get(field_type) if isinstance(field_type, str) else None
+        return factory(field_name, user_input) if factory is not None else None
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    """
+    提取最后一条包含文本的用户消息，找到后立即返回
+    
+    Args:
+        messages: 消息历史
+        
+    Returns:
+        用户消息文本，没有时返回空字符串
+    """
+    for msg in reversed(messages):
+        if msg.get("role") != "user":
+            continue
+        content = msg.get("content", [])
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            for block in content:
+                if isinstance(block, dict) and block.get("text"):
+                    return block["text"]
+    return ""
 
 
 def create_smart_input_generator() -> Callable:
@@ -374,24 +558,8 @@ def create_smart_input_generator() -> Callable:
         Returns:
             生成的工具输入参数
         """
-        # 提取最后一条用户消息
-        user_input = ""
-        for msg in reversed(messages):
-            if msg.get("role") == "user":
-                content = msg.get("content", [])
-                if isinstance(content, str):
-                    user_input = content
-                    break
-                elif isinstance(content, list):
-                    for block in content:
-                        if isinstance(block, dict) and block.get("text"):
-                            user_input = block["text"]
-                            break
-                    if user_input:
-                        break
-        
-        # 使用智能生成器生成参数
-        return generator.generate_input(tool_info, user_input)
+        # 提取最后一条用户消息，使用智能生成器生成参数
+        return generator.generate_input(tool_info, _last_user_text(messages))
     
     return smart_input_generator
 
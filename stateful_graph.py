@@ -15,16 +15,28 @@ StatefulGraph设计方案 - 基于Graph实现优雅的状态管理
 """
 
 import asyncio
-import json
+import logging
+import re
 import time
-from typing import Any, Dict, List, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Callable, Tuple
 from datetime import datetime
 
 from strands import Agent
+from strands.agent.state import AgentState
 from strands.multiagent.graph import Graph, GraphBuilder, GraphNode, GraphState, GraphResult
 from strands.multiagent.base import NodeResult, Status
 from strands.types.content import ContentBlock
 
+from _json_compat import dumps as _dumps, dumps_pretty as _dumps_pretty, loads as _loads
+
+
+logger = logging.getLogger(__name__)
+
+# Agent输出中的JSON对象（从第一个"{"到最后一个"}"），模块加载时编译一次
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+
 
 class UserInteractionRequiredException(Exception):
     """用户交互需求异常 - 用于暂停Graph执行"""
@@ -48,10 +60,14 @@ class UnifiedAgentState:
     4. 易于理解 - 清晰的注释说明每个字段的作用
     """
     
+    # 只作为类级别配置使用，不创建实例属性
+    __slots__ = ()
+    
     # 统一的状态字段映射 - JSON字段名 -> agent.state字段名
     # 注意：只包含需要在Agent间传递的核心状态字段
     # analysis, entities, response 等字段可以在JSON输出中返回，但不需要同步到state
-    UNIFIED_STATE_MAPPING = {
+    # 使用只读映射：所有StateManager共享同一份配置，运行时不允许修改
+    UNIFIED_STATE_MAPPING = MappingProxyType({
         # 业务核心字段 - 需要在Agent间传递
         "subject_type": "subject_type",           # booking, activity, other
         "activity_id": "activity_id",             # abcxxxxx (用户提供或查询得到)
@@ -67,12 +83,15 @@ class UnifiedAgentState:
         "status": "status",                       # 当前执行状态 (Success, Failed, Processing)
         "requires_human": "requires_human",       # 是否需要人工干预
         "confidence": "confidence",               # 置信度 0.0-1.0
-    }
+    })
 
 
 class StateManager:
     """状态管理器 - 基于UnifiedAgentState的状态机模式"""
     
+    # 条件函数每次检查都会访问这些属性；_graph_instance由StatefulGraphBuilder.build()设置
+    __slots__ = ("agents", "global_state", "state_history", "_graph_instance")
+    
     def __init__(self):
         self.agents: Dict[str, Agent] = {}
         self.global_state: Dict[str, Any] = {}
@@ -81,7 +100,7 @@ class StateManager:
     def register_agent(self, agent_id: str, agent: Agent):
         """注册Agent"""
         self.agents[agent_id] = agent
-        print(f"   📋 已注册Agent: {agent_id}")
+        logger.debug("agent_id=<%s> | 已注册Agent", agent_id)
     
     def inject_state_to_agent(self, agent_id: str):
         """将全局状态注入到Agent.state"""
@@ -105,10 +124,9 @@ class StateManager:
         
         try:
             # 解析JSON
-            import re
-            json_match = re.search(r'\{.*\}', output_text, re.DOTALL)
+            json_match = _JSON_OBJECT_RE.search(output_text)
             if json_match:
-                parsed_data = json.loads(json_match.group())
+                parsed_data = _loads(json_match.group())
                 
                 # 使用StateManager内部的状态验证和标准化
                 validated_data = self._validate_and_normalize_state(agent_id, parsed_data)
@@ -117,13 +135,15 @@ class StateManager:
                 
                 # 更新Agent.state - 使用UnifiedAgentState的映射
                 updated_fields = {}
+                set_agent_state = agent.state.set
+                global_state = self.global_state
                 for json_field, state_field in UnifiedAgentState.UNIFIED_STATE_MAPPING.items():
                     if json_field in validated_data:
                         value = validated_data[json_field]
-                        agent.state.set(state_field, value)
+                        set_agent_state(state_field, value)
                         updated_fields[state_field] = value
                         # 同时更新全局状态
-                        self.global_state[state_field] = value
+                        global_state[state_field] = value
                 
                 # 保存完整结果
                 agent.state.set(f"{agent_id}_result", validated_data)
@@ -134,7 +154,7 @@ class StateManager:
                     return True
                     
         except Exception as e:
-            print(f"   ⚠️  状态提取失败 ({agent_id}): {str(e)}")
+            logger.warning("agent_id=<%s>, error=<%s> | 状态提取失败", agent_id, e)
             return False
         
         return False
@@ -155,6 +175,11 @@ class StateManager:
         
         return validated_data
     
+    def reset(self):
+        """清空全局状态和状态变化记录，保留已注册的Agent"""
+        self.global_state.clear()
+        self.state_history.clear()
+    
     def get_state(self, key: str = None) -> Any:
         """获取状态"""
         if key is None:
@@ -171,8 +196,12 @@ class StateManager:
         }
         self.state_history.append(change_record)
         
-        print(f"\n📝 [{change_record['timestamp']}] {agent_id} - {operation}")
-        print(f"   🔄 状态变化: {json.dumps(changes, ensure_ascii=False, indent=2)}")
+        # 每个节点的注入和提取都会记录状态变化，只有开启DEBUG级别时才序列化变化内容
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "agent_id=<%s>, operation=<%s>, timestamp=<%s>, changes=<%s> | 状态变化",
+                agent_id, operation, change_record["timestamp"], _dumps(changes)
+            )
 
 
 class StatefulGraph(Graph):
@@ -191,10 +220,35 @@ class StatefulGraph(Graph):
             if hasattr(node.executor, 'state'):  # 确保是Agent
                 self.state_manager.register_agent(node_id, node.executor)
     
+    def reset(self):
+        """重置单次执行的运行时状态，使同一个图可以复用于新的请求
+        
+        图结构（节点、边、条件函数）保持不变，只清空：
+        1. StateManager中的全局状态和历史记录
+        2. 用户交互等待状态
+        3. 各节点的执行状态和结果（用户输入后的就绪检查依赖节点执行状态）
+        4. 各Agent的对话历史、Agent.state和Mock模型的调用计数
+        """
+        self.state_manager.reset()
+        self.interaction_mode = "auto"
+        self.pending_interaction = None
+        
+        for node in self.nodes.values():
+            node.execution_status = Status.PENDING
+            node.result = None
+            node.execution_time = 0
+        
+        for agent in self.state_manager.agents.values():
+            agent.messages.clear()
+            agent.state = AgentState()
+            # UtilityAgent的Mock模型按调用次数决定是否终止，需要一并重置
+            if hasattr(agent, 'reset_model'):
+                agent.reset_model()
+    
     async def _execute_node(self, node: GraphNode) -> None:
         """重写节点执行方法，添加状态处理逻辑"""
         node.execution_status = Status.EXECUTING
-        print(f"\n🔄 执行节点: {node.node_id}")
+        logger.debug("node_id=<%s> | 执行节点", node.node_id)
         
         # 1. 执行前：注入状态
         self.state_manager.inject_state_to_agent(node.node_id)
@@ -210,13 +264,13 @@ class StatefulGraph(Graph):
                 success = self.state_manager.extract_state_from_agent_output(node.node_id, output_text)
                 
                 if success:
-                    print(f"   ✅ {node.node_id} 状态提取成功")
+                    logger.debug("node_id=<%s> | 状态提取成功", node.node_id)
                 else:
-                    print(f"   ⚠️  {node.node_id} 状态提取失败，使用fallback")
+                    logger.debug("node_id=<%s> | 状态提取失败，使用fallback", node.node_id)
                     self._apply_fallback_state(node.node_id)
             
         except Exception as e:
-            print(f"   ❌ {node.node_id} 执行失败: {str(e)}")
+            logger.error("node_id=<%s>, error=<%s> | 节点执行失败", node.node_id, e)
             # 应用错误fallback
             self._apply_error_fallback(node.node_id, str(e))
             raise
@@ -319,7 +373,7 @@ class StatefulGraph(Graph):
         """输出交互请求到终端"""
         print(f"\n🔔 用户交互请求:")
         print(f"节点: {interaction_request['node_id']}")
-        print(f"原始输出: {json.dumps(interaction_request['raw_output'], ensure_ascii=False, indent=2)}")
+        print(f"原始输出: {_dumps_pretty(interaction_request['raw_output'])}")
         
         # 如果输出中包含选项，显示选项列表
         raw_output = interaction_request['raw_output']
@@ -395,7 +449,7 @@ class StatefulGraph(Graph):
         enhanced_state["user_input_timestamp"] = time.time()
         
         # 重新提取状态（基于增强后的数据）
-        self.state_manager.extract_state_from_agent_output(node_id, json.dumps(enhanced_state))
+        self.state_manager.extract_state_from_agent_output(node_id, _dumps(enhanced_state))
         
         # 额外处理：直接更新全局状态中的用户输入字段
         if isinstance(user_input, dict):
@@ -414,6 +468,34 @@ class StatefulGraph(Graph):
             "direct_updates": user_input if isinstance(user_input, dict) else {"user_selection": user_input}
         })
     
+    def resume(self) -> GraphResult:
+        """提供用户输入后从暂停处继续执行 - 与Graph.__call__一样在独立线程的事件循环中运行"""
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.resume_async()).result()
+    
+    async def resume_async(self) -> GraphResult:
+        """提供用户输入后从暂停处继续执行
+        
+        invoke_async会重建GraphState并从入口节点重新执行所有节点；这里保留暂停时的GraphState，
+        已完成的节点不会再次执行，只从用户输入后新就绪的节点继续。
+        """
+        if self.interaction_mode == "waiting_user":
+            raise ValueError("Graph仍在等待用户输入，请先调用provide_user_input")
+        
+        self.state.status = Status.EXECUTING
+        start_time = time.time()
+        try:
+            # 入口节点已在completed_nodes中，会被跳过，随后按条件边寻找新的就绪节点
+            await self._execute_graph()
+            self.state.status = Status.COMPLETED
+        except Exception:
+            self.state.status = Status.FAILED
+            raise
+        finally:
+            self.state.execution_time += round((time.time() - start_time) * 1000)
+        
+        return self._build_result()
+    
     def _continue_execution(self):
         """继续Graph执行 - 真实实现"""
         try:
@@ -430,7 +512,7 @@ class StatefulGraph(Graph):
             
             # 3. 如果有就绪的节点，创建一个新的执行任务
             if ready_nodes:
-                print(f"🔄 继续执行，发现 {len(ready_nodes)} 个就绪节点")
+                logger.debug("ready_nodes=<%d> | 继续执行，发现就绪节点", len(ready_nodes))
                 
                 # 由于Graph的异步执行机制复杂，这里采用简化的方式
                 # 实际应用中，前端应该重新调用graph()来完整执行
@@ -449,7 +531,7 @@ class StatefulGraph(Graph):
                 }
                 
         except Exception as e:
-            print(f"❌ 继续执行失败: {str(e)}")
+            logger.error("error=<%s> | 继续执行失败", e)
             return {
                 "status": "continue_execution_failed",
                 "error": str(e),
@@ -478,7 +560,7 @@ class StatefulGraph(Graph):
             return node in self.entry_points
             
         except Exception as e:
-            print(f"⚠️ 检查节点就绪状态失败 ({node.node_id}): {str(e)}")
+            logger.warning("node_id=<%s>, error=<%s> | 检查节点就绪状态失败", node.node_id, e)
             return False
 
 
@@ -545,14 +627,15 @@ class StatefulGraphBuilder(GraphBuilder):
                 
                 # 2. 执行正常的条件检查（现在可以访问用户输入）
                 result = condition_func(self.state_manager)
-                print(f"   🔍 状态感知条件检查: {from_node.node_id} -> {to_node.node_id} = {result}")
                 
-                # 显示当前状态信息
-                current_state = self.state_manager.get_state()
-                key_states = {k: v for k, v in current_state.items() 
-                             if not k.endswith('_result') and not k.startswith('_')}
-                if key_states:
-                    print(f"       当前状态: {json.dumps(key_states, ensure_ascii=False)}")
+                # 每条边的每次检查都会执行到这里，只有开启DEBUG级别时才复制和序列化当前状态
+                if logger.isEnabledFor(logging.DEBUG):
+                    key_states = {k: v for k, v in self.state_manager.global_state.items()
+                                  if not k.endswith('_result') and not k.startswith('_')}
+                    logger.debug(
+                        "from_node=<%s>, to_node=<%s>, result=<%s>, state=<%s> | 状态感知条件检查",
+                        from_node.node_id, to_node.node_id, result, _dumps(key_states)
+                    )
                 
                 return result
                 
@@ -560,10 +643,72 @@ class StatefulGraphBuilder(GraphBuilder):
                 # 用户交互异常，重新抛出
                 raise
             except Exception as e:
-                print(f"   ⚠️  状态感知条件检查失败: {str(e)}")
+                logger.warning(
+                    "from_node=<%s>, to_node=<%s>, error=<%s> | 状态感知条件检查失败",
+                    from_node.node_id, to_node.node_id, e
+                )
                 return False
         
         return self.add_edge(from_node, to_node, enhanced_state_aware_condition)
+
+    def add_state_aware_branch(self, from_node, to_nodes: List[GraphNode],
+                               route_func: Callable[[StateManager], Optional[str]],
+                               requires_user_input: bool = False):
+        """添加互斥的状态感知分支 - 一个路由函数决定走向哪个目标节点
+
+        为每个目标节点各添加一条状态感知条件边，条件为"路由结果等于该节点ID"，
+        因此各分支不会同时成立。每次检查都重新调用路由函数，保证读取到最新的全局状态
+        （包括用户输入和条件函数直接写入global_state的字段）。
+
+        Args:
+            from_node: 源节点
+            to_nodes: 候选目标节点列表
+            route_func: 路由函数，接收StateManager，返回目标节点ID；返回None表示暂不路由
+            requires_user_input: 是否需要用户输入才能执行这些边
+
+        Returns:
+            添加的边列表
+        """
+        def branch_condition(target_id: str) -> Callable[[StateManager], bool]:
+            return lambda state_manager: route_func(state_manager) == target_id
+
+        return [
+            self.add_state_aware_edge(from_node, to_node, branch_condition(to_node.node_id), requires_user_input)
+            for to_node in to_nodes
+        ]
+    
+    def add_routing_table(self, from_node, keys: Tuple[str, ...],
+                          table: Dict[tuple, GraphNode],
+                          requires_user_input: bool = False):
+        """添加基于路由表的互斥分支 - 按状态字段的取值组合查表决定目标节点
+
+        构建时把路由规则整理为 {状态值元组: 目标节点ID} 的字典，运行时读取keys对应的
+        状态值后只需一次字典查找。无法用取值组合表达的条件仍使用add_state_aware_edge。
+
+        Args:
+            from_node: 源节点
+            keys: 参与路由的状态字段名
+            table: 路由表，键为与keys一一对应的状态值元组，值为目标节点
+            requires_user_input: 是否需要用户输入才能执行这些边
+
+        Returns:
+            添加的边列表
+        """
+        routes = {state_values: to_node.node_id for state_values, to_node in table.items()}
+        # 同一个目标节点可能对应多个取值组合，只添加一次
+        to_nodes = list({to_node.node_id: to_node for to_node in table.values()}.values())
+
+        def route(state_manager: StateManager) -> Optional[str]:
+            state = state_manager.global_state
+            route_key = tuple(state.get(key) for key in keys)
+            try:
+                return routes.get(route_key)
+            except TypeError:
+                # 状态值不可哈希（如list、dict），不会命中路由表
+                logger.debug("keys=<%s>, route_key=<%s> | 状态值不可哈希，路由表未命中", keys, route_key)
+                return None
+
+        return self.add_state_aware_branch(from_node, to_nodes, route, requires_user_input)
     
     def add_node_with_state(self, executor: Agent, node_id: str = None) -> 'GraphNode':
         """添加节点并自动注册到状态管理器"""
@@ -623,33 +768,28 @@ def create_stateful_customer_service():
     builder.add_edge(entry_node, route_node)
     
     # 基于状态的条件路由 - 真正的状态感知
-    def needs_human(state_manager: StateManager) -> bool:
-        """检查是否需要人工干预 - 可以访问最新状态"""
-        requires_human = state_manager.get_state("requires_human")
-        stage = state_manager.get_state("stage")
-        status = state_manager.get_state("status")
-        
-        print(f"     🤔 人工干预检查: requires_human={requires_human}, stage={stage}, status={status}")
-        
-        return (stage == "route_agent" and 
-                status == "Success" and 
-                requires_human == True)
-    
-    def needs_auto_processing(state_manager: StateManager) -> bool:
-        """检查是否需要自动处理 - 可以访问最新状态"""
-        requires_human = state_manager.get_state("requires_human")
-        stage = state_manager.get_state("stage")
-        status = state_manager.get_state("status")
-        
-        print(f"     🤖 自动处理检查: requires_human={requires_human}, stage={stage}, status={status}")
+    def route_decision(state_manager: StateManager) -> Optional[str]:
+        """路由决策：需要人工干预时转人工，否则进入意图分析 - 可以访问最新状态"""
+        # 一次读取决策所需的全部状态，两条出边共用同一个决策结果
+        state = state_manager.global_state
+        requires_human = state.get("requires_human")
+        stage = state.get("stage")
+        status = state.get("status")
+        
+        logger.debug(
+            "requires_human=<%s>, stage=<%s>, status=<%s> | 路由决策检查", requires_human, stage, status
+        )
         
-        return (stage == "route_agent" and 
-                status == "Success" and 
-                not requires_human)
+        if stage != "route_agent" or status != "Success":
+            return None
+        if requires_human == True:
+            return "transfer_agent"
+        if not requires_human:
+            return "intent_agent"
+        return None
     
-    # 使用真正的状态感知条件边
-    builder.add_state_aware_edge(route_node, transfer_node, needs_human)
-    builder.add_state_aware_edge(route_node, intent_node, needs_auto_processing)
+    # 使用真正的状态感知条件边 - 两个互斥分支由同一个路由函数决定
+    builder.add_state_aware_branch(route_node, [transfer_node, intent_node], route_decision)
     builder.add_edge(intent_node, answer_node)
     
     # 设置入口点
@@ -659,6 +799,12 @@ def create_stateful_customer_service():
 
 
 if __name__ == "__main__":
+    # 演示时输出本模块的节点执行和状态变化过程，不修改根logger
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    
     print("🎯 StatefulGraph设计方案测试 - 继承模式，实时状态处理")
     
     # 创建系统
@@ -681,7 +827,7 @@ if __name__ == "__main__":
         # 打印最终状态
         final_state = graph.state_manager.get_state()
         print(f"\n📊 最终状态:")
-        print(json.dumps(final_state, ensure_ascii=False, indent=2))
+        print(_dumps_pretty(final_state))
         
     except Exception as e:
         print(f"❌ 执行失败: {str(e)}")
@@ -0,0 +1,67 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from _json_compat import dumps_bytes
+from auto_mock_model import AutoMockToolCallingModel
+
+
+def assert_serializes_events(actual, events):
+    """The bytes match the active _json_compat backend and decode back to the events with the stdlib."""
+    assert actual == [dumps_bytes(event) for event in events]
+    assert [json.loads(chunk) for chunk in actual] == events
+
+
+@pytest.fixture
+def request_with_tool():
+    return {
+        "messages": [{"role": "user", "content": [{"text": "请计算 15 * 8"}]}],
+        "tool_specs": [
+            {
+                "name": "calculator",
+                "description": "Calculate an expression",
+                "inputSchema": {
+                    "json": {
+                        "properties": {"expression": {"type": "string"}},
+                        "required": ["expression"],
+                    }
+                },
+            }
+        ],
+        "system_prompt": None,
+    }
+
+
+@pytest.fixture
+def fixed_uuid():
+    with patch("auto_mock_model.uuid.uuid4") as mock_uuid4:
+        mock_uuid4.return_value.hex = "0123456789abcdef"
+        yield mock_uuid4
+
+
+@pytest.mark.parametrize("response_text", ["我将使用可用的工具来帮助您。", ""])
+def test_stream_bytes_matches_stream_events(request_with_tool, fixed_uuid, response_text):
+    events = list(AutoMockToolCallingModel(response_text=response_text).stream(request_with_tool))
+    actual = list(AutoMockToolCallingModel(response_text=response_text)._stream_bytes(request_with_tool))
+
+    assert_serializes_events(actual, events)
+
+
+def test_stream_bytes_matches_stream_events_after_max_tool_calls(request_with_tool):
+    model = AutoMockToolCallingModel(max_tool_calls=0)
+    events = list(model.stream(request_with_tool))
+
+    model = AutoMockToolCallingModel(max_tool_calls=0)
+    actual = list(model._stream_bytes(request_with_tool))
+
+    assert_serializes_events(actual, events)
+    assert json.loads(actual[-2]) == {"messageStop": {"stopReason": "end_turn"}}
+
+
+def test_stream_bytes_matches_stream_events_without_tools(request_with_tool):
+    request_with_tool["tool_specs"] = []
+    events = list(AutoMockToolCallingModel().stream(request_with_tool))
+    actual = list(AutoMockToolCallingModel()._stream_bytes(request_with_tool))
+
+    assert_serializes_events(actual, events)
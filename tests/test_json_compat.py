@@ -0,0 +1,87 @@
+import importlib
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import _json_compat
+
+_FUNCTIONS = ("dumps", "dumps_bytes", "dumps_pretty", "print_pretty", "loads")
+
+
+def _snapshot(module):
+    """Capture the module's functions; reload() replaces them on the same module object."""
+    return SimpleNamespace(**{name: getattr(module, name) for name in _FUNCTIONS})
+
+
+@pytest.fixture
+def orjson_json_compat():
+    """The module as imported with orjson installed; request it before fallback_json_compat."""
+    orjson = pytest.importorskip("orjson")
+    assert _json_compat.loads is orjson.loads
+    return _snapshot(_json_compat)
+
+
+@pytest.fixture
+def fallback_json_compat(monkeypatch):
+    """Load _json_compat as if orjson were not installed."""
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    fallback = _snapshot(importlib.reload(_json_compat))
+    assert fallback.loads is json.loads
+    yield fallback
+    monkeypatch.undo()
+    importlib.reload(_json_compat)
+
+
+@pytest.fixture
+def values():
+    return [
+        {"stage": "route_agent", "confidence": 0.9, "requires_human": False, "options": ["订单查询", "退款退货"]},
+        {"nested": {"list": [1, 2, {"deep": None}]}, "text": "中文 and ascii"},
+        {1: "int key", "str": "value"},
+        [],
+        {},
+        "纯文本",
+    ]
+
+
+def test_fallback_dumps_matches_orjson(orjson_json_compat, fallback_json_compat, values):
+    for value in values:
+        assert fallback_json_compat.dumps(value) == orjson_json_compat.dumps(value)
+        assert fallback_json_compat.dumps_bytes(value) == orjson_json_compat.dumps_bytes(value)
+
+
+def test_fallback_dumps_pretty_matches_orjson(orjson_json_compat, fallback_json_compat, values):
+    for value in values:
+        assert fallback_json_compat.dumps_pretty(value) == orjson_json_compat.dumps_pretty(value)
+
+
+def test_fallback_print_pretty_matches_orjson(orjson_json_compat, fallback_json_compat, values, capsys):
+    for value in values:
+        orjson_json_compat.print_pretty(value)
+        expected = capsys.readouterr().out
+
+        fallback_json_compat.print_pretty(value)
+        assert capsys.readouterr().out == expected
+
+
+def test_loads_round_trip(orjson_json_compat, values):
+    for value in values[:2]:
+        assert orjson_json_compat.loads(orjson_json_compat.dumps(value)) == value
+
+
+def test_fallback_loads_round_trip(fallback_json_compat, values):
+    for value in values[:2]:
+        assert fallback_json_compat.loads(fallback_json_compat.dumps(value)) == value
+
+
+def test_fallback_output_format(fallback_json_compat, capsys):
+    value = {"text": "中文", "items": [1, 2], 1: None}
+
+    assert fallback_json_compat.dumps(value) == '{"text":"中文","items":[1,2],"1":null}'
+    assert fallback_json_compat.dumps_bytes(value) == '{"text":"中文","items":[1,2],"1":null}'.encode()
+    assert fallback_json_compat.dumps_pretty({"items": [1]}) == '{\n  "items": [\n    1\n  ]\n}'
+
+    fallback_json_compat.print_pretty({"items": [1]})
+    assert capsys.readouterr().out == '{\n  "items": [\n    1\n  ]\n}\n'
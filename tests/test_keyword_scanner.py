@@ -0,0 +1,50 @@
+import pytest
+
+from _keyword_scanner import compile_any_keyword, compile_keyword_scanner
+
+
+def test_compile_any_keyword_matches_substring():
+    pattern = compile_any_keyword(["to", "a.b"])
+
+    assert pattern.search("customer")
+    assert pattern.search("xa.by")
+    assert not pattern.search("axb")
+
+
+def test_compile_keyword_scanner_finds_overlapping_keywords():
+    scanner = compile_keyword_scanner(["不满", "非常不满", "满意"])
+
+    assert set(scanner.findall("我非常不满意")) == {"非常不满", "不满", "满意"}
+
+
+def test_compile_keyword_scanner_matches_substring_checks():
+    keywords = ["客服", "联系客服", "服务", "order", "der"]
+    scanner = compile_keyword_scanner(keywords)
+
+    for text in ["联系客服服务", "reorder", "客", "", "orderder"]:
+        assert set(scanner.findall(text)) == {kw for kw in keywords if kw in text}
+
+
+@pytest.mark.parametrize(
+    "keywords",
+    [
+        ["查询", "查询订单"],
+        ["help", "订单", "helpful"],
+        ["a", "ab", "abc"],
+    ],
+)
+def test_compile_keyword_scanner_rejects_prefix_keywords(keywords):
+    with pytest.raises(ValueError, match="前缀"):
+        compile_keyword_scanner(keywords)
+
+
+def test_compile_keyword_scanner_allows_duplicates():
+    scanner = compile_keyword_scanner(["退款", "退款", "投诉"])
+
+    assert scanner.findall("退款投诉") == ["退款", "投诉"]
+
+
+@pytest.mark.parametrize("keywords", [[], [""], ["", "退款"]])
+def test_compile_keyword_scanner_rejects_empty_keywords(keywords):
+    with pytest.raises(ValueError):
+        compile_keyword_scanner(keywords)
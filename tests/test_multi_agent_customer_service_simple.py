@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+import pytest
+
+import multi_agent_customer_service_simple
+from multi_agent_customer_service_simple import MultiAgentCustomerService
+
+
+@pytest.fixture(autouse=True)
+def shared_graph_cache():
+    multi_agent_customer_service_simple._get_shared_graph.cache_clear()
+    yield
+    multi_agent_customer_service_simple._get_shared_graph.cache_clear()
+
+
+def test_instances_build_their_own_graph_by_default():
+    assert MultiAgentCustomerService().graph is not MultiAgentCustomerService().graph
+
+
+def test_reuse_graph_shares_one_graph_per_process():
+    with patch.object(
+        MultiAgentCustomerService, "_create_graph", wraps=MultiAgentCustomerService._create_graph
+    ) as create_graph:
+        first = MultiAgentCustomerService(reuse_graph=True)
+        second = MultiAgentCustomerService(reuse_graph=True)
+
+    assert first.graph is second.graph
+    create_graph.assert_called_once_with()
+
+
+def test_reuse_graph_is_not_shared_with_default_instances():
+    shared = MultiAgentCustomerService(reuse_graph=True)
+
+    assert MultiAgentCustomerService().graph is not shared.graph
+
+
+def test_interactive_demo_uses_shared_graph():
+    with (
+        patch.object(multi_agent_customer_service_simple, "MultiAgentCustomerService") as service_class,
+        patch("builtins.input", return_value="quit"),
+        patch("builtins.print"),
+    ):
+        multi_agent_customer_service_simple.interactive_demo()
+
+    service_class.assert_called_once_with(reuse_graph=True)
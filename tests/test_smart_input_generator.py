@@ -0,0 +1,99 @@
+import itertools
+
+import pytest
+
+import smart_input_generator
+from smart_input_generator import SmartInputGenerator
+
+
+@pytest.fixture(autouse=True)
+def default_counter(monkeypatch):
+    monkeypatch.setattr(smart_input_generator, "_default_counter", itertools.count())
+
+
+@pytest.fixture
+def generator():
+    return SmartInputGenerator()
+
+
+def tool_info(properties):
+    return {"spec": {"properties": properties}}
+
+
+def test_number_default_is_non_integral_float(generator):
+    params = generator.generate_input(tool_info({"weight": {"type": "number"}}), "")
+
+    assert isinstance(params["weight"], float)
+    assert not params["weight"].is_integer()
+    assert 1.0 <= params["weight"] <= 100.0
+
+
+def test_number_default_cycles_deterministically(generator):
+    info = tool_info({"weight": {"type": "number"}})
+
+    values = [generator.generate_input(info, "")["weight"] for _ in range(100)]
+
+    assert values[:3] == [1.5, 2.5, 3.5]
+    assert values[98] == 99.5
+    assert values[99] == 1.5
+    assert all(1.0 <= value <= 100.0 for value in values)
+
+
+def test_number_default_counter_is_shared_between_generators(generator):
+    info = tool_info({"weight": {"type": "number"}})
+
+    first = generator.generate_input(info, "")["weight"]
+    second = SmartInputGenerator().generate_input(info, "")["weight"]
+
+    assert (first, second) == (1.5, 2.5)
+
+
+def test_integer_default_cycles_deterministically(generator):
+    info = tool_info({"count": {"type": "integer"}})
+
+    values = [generator.generate_input(info, "")["count"] for _ in range(101)]
+
+    assert values[:100] == list(range(1, 101))
+    assert values[100] == 1
+
+
+@pytest.mark.parametrize(
+    ("field_schema", "expected"),
+    [
+        ({"type": "number", "default": 42}, 42),
+        ({"type": "number", "enum": [0.25, 0.75]}, 0.25),
+    ],
+)
+def test_number_schema_default_and_enum_take_precedence(generator, field_schema, expected):
+    params = generator.generate_input(tool_info({"weight": field_schema}), "")
+
+    assert params["weight"] == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("会议在2024-01-02 12:30", "2024-01-02"),
+        ("12:30 开会，2024-01-02", "2024-01-02"),
+        ("12:3456-78-90", "3456-78-90"),
+        ("2024年1月2日 明天 09:15", "09:15"),
+        ("明天 2024年1月2日", "2024年1月2日"),
+        ("明天见", "明天"),
+    ],
+)
+def test_extract_time_prefers_higher_priority_pattern(generator, text, expected):
+    assert generator._extract_time(text) == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("打开 /usr/bin/x 和 report.pdf", "report.pdf"),
+        ("打开 /usr/bin/x", "/usr/bin/x"),
+        ("C:\\dir/tmp", "/tmp"),
+        ("C:\\dir\\file", "C:\\dir\\file"),
+        ("没有文件", None),
+    ],
+)
+def test_extract_file_info_prefers_higher_priority_pattern(generator, text, expected):
+    assert generator._extract_file_info(text) == expected
@@ -0,0 +1,305 @@
+import json
+import logging
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from strands.agent import Agent, AgentResult
+from strands.agent.state import AgentState
+from strands.hooks.registry import HookRegistry
+from strands.multiagent.base import Status
+
+from stateful_graph import StateManager, StatefulGraphBuilder, UserInteractionRequiredException
+
+
+def create_mock_agent(name, output=None):
+    """Create a mock Agent whose response text is the JSON encoded output."""
+    agent = Mock(spec=Agent)
+    agent.name = name
+    agent.id = f"{name}_id"
+    agent._session_manager = None
+    agent.hooks = HookRegistry()
+    agent.state = AgentState()
+    agent.messages = []
+
+    mock_result = AgentResult(
+        message={"role": "assistant", "content": [{"text": json.dumps(output or {"stage": name})}]},
+        stop_reason="end_turn",
+        state={},
+        metrics=Mock(
+            accumulated_usage={"inputTokens": 10, "outputTokens": 20, "totalTokens": 30},
+            accumulated_metrics={"latencyMs": 100.0},
+        ),
+    )
+
+    async def mock_invoke_async(*args, **kwargs):
+        agent.messages.append(mock_result.message)
+        return mock_result
+
+    agent.invoke_async = MagicMock(side_effect=mock_invoke_async)
+    return agent
+
+
+def edge_conditions(graph, from_node_id):
+    """Map target node id -> condition for every edge leaving from_node_id."""
+    return {edge.to_node.node_id: edge.condition for edge in graph.edges if edge.from_node.node_id == from_node_id}
+
+
+@pytest.fixture
+def builder():
+    return StatefulGraphBuilder()
+
+
+@pytest.fixture
+def nodes(builder):
+    return {name: builder.add_node(create_mock_agent(name), name) for name in ("source", "left", "right")}
+
+
+def test_state_aware_branch_routes_to_single_target(builder, nodes):
+    builder.add_state_aware_branch(
+        nodes["source"], [nodes["left"], nodes["right"]], lambda state_manager: state_manager.global_state.get("target")
+    )
+    graph = builder.build()
+    conditions = edge_conditions(graph, "source")
+
+    graph.state_manager.global_state["target"] = "left"
+
+    assert conditions["left"](graph.state) is True
+    assert conditions["right"](graph.state) is False
+
+
+def test_state_aware_branch_reroutes_after_global_state_change(builder, nodes):
+    builder.add_state_aware_branch(
+        nodes["source"], [nodes["left"], nodes["right"]], lambda state_manager: state_manager.global_state.get("target")
+    )
+    graph = builder.build()
+    conditions = edge_conditions(graph, "source")
+    state_manager = graph.state_manager
+
+    state_manager.global_state["target"] = "left"
+    assert conditions["left"](graph.state) is True
+
+    # Written directly to global_state, without a state_history entry or a newly completed node
+    state_manager.global_state["target"] = "right"
+    history_length = len(state_manager.state_history)
+
+    assert conditions["left"](graph.state) is False
+    assert conditions["right"](graph.state) is True
+    assert len(state_manager.state_history) == history_length
+
+
+def test_state_aware_branch_no_route(builder, nodes):
+    builder.add_state_aware_branch(nodes["source"], [nodes["left"], nodes["right"]], lambda state_manager: None)
+    graph = builder.build()
+    conditions = edge_conditions(graph, "source")
+
+    assert conditions["left"](graph.state) is False
+    assert conditions["right"](graph.state) is False
+
+
+def test_state_aware_branch_calls_route_func_on_every_check(builder, nodes):
+    route_func = Mock(return_value="left")
+    builder.add_state_aware_branch(nodes["source"], [nodes["left"], nodes["right"]], route_func)
+    graph = builder.build()
+    conditions = edge_conditions(graph, "source")
+
+    for _ in range(2):
+        conditions["left"](graph.state)
+        conditions["right"](graph.state)
+
+    assert route_func.call_count == 4
+    route_func.assert_called_with(graph.state_manager)
+
+
+@pytest.fixture
+def routing_graph(builder, nodes):
+    builder.add_routing_table(
+        nodes["source"],
+        ("event_type", "priority"),
+        {
+            ("order", "high"): nodes["left"],
+            ("order", "low"): nodes["right"],
+            ("refund", "high"): nodes["left"],
+        },
+    )
+    return builder.build()
+
+
+def routed_targets(graph):
+    return {target for target, condition in edge_conditions(graph, "source").items() if condition(graph.state)}
+
+
+def test_routing_table_adds_one_edge_per_target(routing_graph):
+    assert set(edge_conditions(routing_graph, "source")) == {"left", "right"}
+
+
+@pytest.mark.parametrize(
+    ("state", "expected"),
+    [
+        ({"event_type": "order", "priority": "high"}, {"left"}),
+        ({"event_type": "order", "priority": "low"}, {"right"}),
+        ({"event_type": "refund", "priority": "high"}, {"left"}),
+    ],
+)
+def test_routing_table_hit(routing_graph, state, expected):
+    routing_graph.state_manager.global_state.update(state)
+
+    assert routed_targets(routing_graph) == expected
+
+
+@pytest.mark.parametrize(
+    "state",
+    [
+        {"event_type": "refund", "priority": "low"},
+        {"event_type": "order"},
+        {},
+    ],
+)
+def test_routing_table_miss(routing_graph, state):
+    routing_graph.state_manager.global_state.update(state)
+
+    assert routed_targets(routing_graph) == set()
+
+
+def test_routing_table_unhashable_value(routing_graph, caplog):
+    routing_graph.state_manager.global_state.update({"event_type": ["order"], "priority": "high"})
+
+    with caplog.at_level(logging.DEBUG, logger="stateful_graph"):
+        assert routed_targets(routing_graph) == set()
+
+    assert "route_key=<(['order'], 'high')>" in caplog.text
+
+
+def test_routing_table_global_state_change_between_checks(routing_graph):
+    global_state = routing_graph.state_manager.global_state
+
+    global_state.update({"event_type": "order", "priority": "high"})
+    assert routed_targets(routing_graph) == {"left"}
+
+    global_state["priority"] = "low"
+    assert routed_targets(routing_graph) == {"right"}
+
+    global_state["event_type"] = "refund"
+    assert routed_targets(routing_graph) == set()
+
+
+def test_state_manager_reset_keeps_registered_agents():
+    state_manager = StateManager()
+    agent = create_mock_agent("agent")
+    state_manager.register_agent("agent", agent)
+    state_manager.global_state["event_type"] = "order"
+    state_manager._log_change("agent", "extract", {"event_type": "order"})
+
+    state_manager.reset()
+
+    assert state_manager.global_state == {}
+    assert state_manager.state_history == []
+    assert state_manager.agents == {"agent": agent}
+
+
+@pytest.fixture
+def linear_graph(builder):
+    first = builder.add_node(create_mock_agent("first", {"stage": "first", "event_type": "order"}), "first")
+    second = builder.add_node(create_mock_agent("second", {"stage": "second", "priority": "high"}), "second")
+    builder.add_state_aware_edge(
+        first, second, lambda state_manager: state_manager.global_state.get("event_type") == "order"
+    )
+    return builder.build()
+
+
+def test_stateful_graph_reset_clears_run_state(linear_graph):
+    linear_graph("task")
+    assert linear_graph.state_manager.global_state["priority"] == "high"
+
+    linear_graph.reset()
+
+    assert linear_graph.state_manager.global_state == {}
+    assert linear_graph.state_manager.state_history == []
+    for node in linear_graph.nodes.values():
+        assert node.execution_status == Status.PENDING
+        assert node.result is None
+        assert node.executor.messages == []
+        assert node.executor.state.get() == {}
+
+
+def test_stateful_graph_run_twice_does_not_leak(linear_graph):
+    first_result = linear_graph("first task")
+    first_state = linear_graph.state_manager.get_state()
+    first_history_length = len(linear_graph.state_manager.state_history)
+
+    linear_graph.reset()
+    second_result = linear_graph("second task")
+
+    assert first_result.status == second_result.status == Status.COMPLETED
+    assert second_result.completed_nodes == 2
+    assert linear_graph.state_manager.get_state() == first_state
+    assert len(linear_graph.state_manager.state_history) == first_history_length
+    for node in linear_graph.nodes.values():
+        assert len(node.executor.messages) == 1
+        assert node.executor.invoke_async.call_count == 2
+
+
+@pytest.fixture
+def interactive_graph(builder):
+    """entry -> select (waits for user input) -> chosen/other, routed by the user's selection."""
+    entry = builder.add_node(create_mock_agent("entry"), "entry")
+    select = builder.add_node(create_mock_agent("select", {"stage": "select", "options": ["A", "B"]}), "select")
+    chosen = builder.add_node(create_mock_agent("chosen"), "chosen")
+    other = builder.add_node(create_mock_agent("other"), "other")
+    builder.add_state_aware_edge(entry, select, lambda state_manager: True)
+    builder.add_state_aware_branch(
+        select,
+        [chosen, other],
+        lambda state_manager: "chosen" if state_manager.global_state.get("user_selection") == "A" else "other",
+        requires_user_input=True,
+    )
+    return builder.build()
+
+
+def pause_for_input(graph):
+    with pytest.raises(UserInteractionRequiredException) as exc_info:
+        graph("task")
+
+    assert graph.interaction_mode == "waiting_user"
+    assert exc_info.value.interaction_request["node_id"] == "select"
+
+
+def assert_resumed_without_rerun(graph, result):
+    assert result.status == Status.COMPLETED
+    assert [node.node_id for node in result.execution_order] == ["entry", "select", "chosen"]
+    assert graph.nodes["entry"].executor.invoke_async.call_count == 1
+    assert graph.nodes["select"].executor.invoke_async.call_count == 1
+    assert graph.nodes["chosen"].executor.invoke_async.call_count == 1
+    assert graph.nodes["other"].executor.invoke_async.call_count == 0
+
+
+def test_resume_after_user_input(interactive_graph):
+    pause_for_input(interactive_graph)
+
+    interactive_graph.provide_user_input("A")
+    result = interactive_graph.resume()
+
+    assert_resumed_without_rerun(interactive_graph, result)
+
+
+@pytest.mark.asyncio
+async def test_resume_async_after_user_input(interactive_graph):
+    with pytest.raises(UserInteractionRequiredException):
+        await interactive_graph.invoke_async("task")
+
+    interactive_graph.provide_user_input("A")
+    result = await interactive_graph.resume_async()
+
+    assert_resumed_without_rerun(interactive_graph, result)
+
+
+def test_resume_while_waiting_for_user_input(interactive_graph):
+    pause_for_input(interactive_graph)
+
+    with pytest.raises(ValueError, match="等待用户输入"):
+        interactive_graph.resume()
+
+
+def test_provide_user_input_when_not_waiting(interactive_graph):
+    with pytest.raises(ValueError):
+        interactive_graph.provide_user_input("A")